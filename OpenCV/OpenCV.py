@@ -115,108 +115,107 @@ def select_mode():
     root.mainloop()
 
 
-def preprocess(image):
-    # Convert image to grayscale so it's easier process for the computer
-    processed = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    for _ in range(2):
-        # Blur the image so that only the most important details remain
-        processed = cv2.GaussianBlur(processed, (9, 9), 5)
-        # Use an adaptive threshold to separate the music sheet from the background
-        processed = cv2.adaptiveThreshold(processed, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 101, 1)
-    # Function returns the final processed image
-    return processed
-
-
-# Reorder points so that each corner is in the correct position
-def reorder(points):
-    # Shape the numpy array into something easier to work with
-    points = points.reshape((4, 2))
-    # Create empty numpy array
-    reordered = np.zeros((4, 1, 2), np.int32)
-    # Do the sum of each point in array of points (adds x pixel value of point to y value)
-    points_sum = points.sum(1)
-    # Do the difference of each point in array of points (adds x pixel value of point to y value)
-    points_difference = np.diff(points, axis=1)
-    # The minimum corresponds to the top left corner (e.g.: 0 + 0)
-    reordered[0] = points[np.argmin(points_sum)]
-    # The maximum corresponds to the bottom right corner (since pixel value increases the more you go right and down)
-    reordered[3] = points[np.argmax(points_sum)]
-    # The biggest absolute difference (y to x) occurs in the two other points
-    # When you subtract the height to the width of the upper right corner, you get the lowest possible number out of the four corners
-    reordered[1] = points[np.argmin(points_difference)]
-    # Idem but for the lower left corner, you get the highest possible difference
-    reordered[2] = points[np.argmax(points_difference)]
-    # Function returns the reordered points (up to down, left to right corners)
-    return reordered
-
-
-def rescale(points, width, height, final_width, final_height):
-    # Shape the numpy array into something easier to work with
-    points = points.reshape((4, 2))
-    # Scale up each of the points to the image's original scale
-    for point_num in range(4):
-        points[point_num] = [int(points[point_num][0]) * final_width // width, int(points[point_num][1]) * final_height // height]
-    # Reshape the numpy array into a format that OpenCVfolder can read
-    points = points.reshape((4, 1, 2))
-    # Function returns the scaled points
-    return points
-
-
-def get_sheet_corners(image, total_area):
-    # Initialize empty numpy array and maximum area value
-    sheet_corners = np.array([])
-    max_area = 0
-    final_contour = np.array([])
-    # Get all the outline of the objects that OpenCVfolder detects
-    contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-    # For each contour
-    for contour in contours:
-        # Get the surface area
-        area = cv2.contourArea(contour)
-        # Check if surface area is big enough (this ignores all the tiny bits of corny shit that we don't need)
-        if area > total_area // 8:
-            # Get perimeter of the shape detected by OpenCVfolder
-            perimeter = cv2.arcLength(contour, True)
-            # Allow difference of 10% from predicted perimeter (perimeter of a perfect polygon
-            # that closely matches the shape detected in the image)
-            approximation = cv2.approxPolyDP(contour, 0.1 * perimeter, True)
-            # Calculate the number of sides
-            num_sides = len(approximation)
-            # Only retain the biggest 4 sided shape
-            if area > max_area and num_sides == 4:
-                sheet_corners = approximation
-                max_area = area
-                final_contour = contour
-    # Function returns either an empty array or the four corners of a quadrilateral polygon detected in the image
-    return sheet_corners, final_contour
-
-
-def warp(image, sheet_corners, width, height):
-    # Get the correct order for all four corners
-    sheet_corners = reorder(sheet_corners)
-    # Convert all four numbers into numpy float format
-    points1 = np.float32(sheet_corners)
-    # Set the final position of each corner (the corners of the window)
-    points2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
-    # Calculates by how much to warp each of the four sides
-    matrix = cv2.getPerspectiveTransform(points1, points2)
-    # Warp the image based on the perspective matrix
-    processed = cv2.warpPerspective(image, matrix, (width, height))
-    # Function returns warped image OpenCVfolder object
-    return processed
-
-
 def create_pygame_image(image, width, height, rotation=0):
-    # Convert the colors to from BGR (OpenCVfolder format) to RGB (pygame format) and make the pygame image from the array
-    pygame_image = pygame.surfarray.make_surface(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    # Rotate 90 degrees anticlockwise and flip the image on its x axis
-    pygame_image = pygame.transform.flip(pygame.transform.rotate(pygame_image, 90 * (rotation % 4 - 1)), True, False)
-    # Scale the image down with a little bit of anti-aliasing
-    pygame_image = pygame.transform.smoothscale(pygame_image, (width, height))
+    # Number of clockwise quarter turns to apply
+    quarter_turns = rotation % 4
+    # Scale the image down first (area interpolation anti-aliases) so that the color conversion and the pygame surface
+    # only ever handle the viewing resolution instead of the full resolution
+    # A quarter turn swaps the dimensions, so scale to the swapped size before rotating
+    if quarter_turns % 2:
+        resized = cv2.resize(image, (height, width), interpolation=cv2.INTER_AREA)
+    else:
+        resized = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    # Convert the colors to from BGR (OpenCVfolder format) to RGB (pygame format)
+    resized = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    # Rotate clockwise and swap the axes, since pygame arrays are indexed by x first and OpenCVfolder arrays by y first
+    pygame_image = pygame.surfarray.make_surface(np.rot90(resized, -quarter_turns).swapaxes(0, 1))
     # Function returns pygame surface object
     return pygame_image
 
 
+# Pygame surface of the live camera view, updated in place from each frame instead of creating a new one every frame
+class FrameSurface:
+    def __init__(self, width, height):
+        # Viewing dimensions
+        self.width = width
+        self.height = height
+        # Downscaled frame (BGR) and its RGB conversion, reused from one frame to the next
+        self.resized = np.empty((height, width, 3), np.uint8)
+        self.rgb = np.empty((height, width, 3), np.uint8)
+        self.surface = pygame.Surface((width, height))
+
+    def update(self, image):
+        cv2.resize(image, (self.width, self.height), dst=self.resized, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        # Pygame arrays are indexed by x first, the swapped axes are only a view of the RGB buffer
+        pygame.surfarray.blit_array(self.surface, self.rgb.swapaxes(0, 1))
+        return self.surface
+
+
+# Keeps the surfaces and warps that the user can go back and forth between, so that clicking ROTATE or pressing 'r'
+# doesn't convert the full resolution image all over again
+class SurfaceCache:
+    def __init__(self, size):
+        # Maximum number of entries kept in each cache (oldest entries are dropped first)
+        self.size = size
+        # Both caches map a key to a (source image, result) pair. Keeping a reference to the source image
+        # guarantees that its id can't be reused by another image while the entry exists
+        self.surfaces = OrderedDict()
+        # Only the latest full resolution warp is kept (a few pages of a big photo take hundreds of MB)
+        self.warps = OrderedDict()
+
+    def _get(self, cache, key, image):
+        entry = cache.get(key)
+        if entry is None or entry[0] is not image:
+            return None
+        # Mark entry as the most recently used
+        cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, cache, key, image, value):
+        cache[key] = (image, value)
+        cache.move_to_end(key)
+        # Drop the least recently used entries
+        while len(cache) > self.size:
+            cache.popitem(last=False)
+        return value
+
+    def surface(self, image, width, height, rotation=0):
+        quarter_turns = rotation % 4
+        key = (id(image), quarter_turns, width, height)
+        pygame_image = self._get(self.surfaces, key, image)
+        if pygame_image is None:
+            if not quarter_turns:
+                pygame_image = create_pygame_image(image, width, height)
+            else:
+                # Rotate the already downscaled viewing surface instead of the full resolution image
+                pygame_image = pygame.transform.rotate(self.surface(image, width, height), -90 * quarter_turns)
+                # A quarter turn swaps the dimensions, stretch the surface back to the viewing dimensions
+                if quarter_turns % 2:
+                    pygame_image = pygame.transform.smoothscale(pygame_image, (width, height))
+            self._store(self.surfaces, key, image, pygame_image)
+        return pygame_image
+
+    def warp_pages(self, image, pages_corners, width, height):
+        key = (id(image), np.asarray(pages_corners).tobytes(), width, height)
+        warped_pages = self._get(self.warps, key, image)
+        if warped_pages is None:
+            # Forget the previous warp and the surfaces made from its pages, so that nothing keeps the old pages alive
+            for _, previous_pages in self.warps.values():
+                for surface_key, (source, _) in list(self.surfaces.items()):
+                    if any(source is previous_page for previous_page in previous_pages):
+                        del self.surfaces[surface_key]
+            self.warps.clear()
+            # Keep the full resolution warp of each page (used for exporting) for these corners
+            warped_pages = self._store(self.warps, key, image, warp_pages(image, pages_corners, width, height))
+        return warped_pages
+
+    def clear(self):
+        # Release the references to the source images (e.g.: when the camera starts capturing again)
+        self.surfaces.clear()
+        self.warps.clear()
+
+
 def display_text(window, font, text, color, width, height, height_ratio):
     # Render text and calculate position
     text_object = font.render(text, True, color)
@@ -241,8 +240,16 @@ def main():
     # Calculate camera height based on camera aspect ratio
     CAMERA_HEIGHT = round(initial_h * CAMERA_WIDTH / initial_w)
 
-    # Regulate max frames per second (actual FPS is probably way lower)
-    clock = pygame.time.Clock()
+    # Regulate max frames per second (actual FPS is probably way lower), or sleep until the user does something
+    pacer = Pacer(PACING)
+    # Ticks at which the next frame has to run (the first frame runs right away)
+    deadline = pygame.time.get_ticks()
+    # Keep the viewing surfaces and the full resolution warp so that going back and forth is instant
+    surface_cache = SurfaceCache(SURFACE_CACHE_SIZE)
+    # Resize, grayscale, blur and threshold each frame in buffers that are reused from one frame to the next
+    preprocessor = Preprocessor(width, height)
+    # Same for the live camera view
+    frame_surface = FrameSurface(CAMERA_WIDTH, CAMERA_HEIGHT)
 
     # Initialize local variables that keep track of the user's actions
     click = None
@@ -253,14 +260,17 @@ def main():
     capturing = True
     analysing = False
     # Initialize other local variables
-    warped_image = None
+    warped_pages = []
     final_image = None
     computer_pygame_image = None
     computer_image = np.zeros([1, 1, 3], dtype=np.uint32)
-    sheet_corners = np.empty(0)
-    corners_copy = np.empty(0)
-    not_black = 0
+    # Corners of every detected page, shape (number of pages, 4 corners, x and y)
+    sheet_corners = np.empty((0, 4, 2))
+    corners_copy = np.empty((0, 4, 2))
+    not_black = False
     rotation = 0
+    # Page currently displayed after cropping
+    page = 0
 
     # Create pygame window
     window = pygame.display.set_mode((CAMERA_WIDTH + SPACING, CAMERA_HEIGHT))
@@ -270,9 +280,10 @@ def main():
     # Main loop
     running = True
     while running:
-        # Cover everything in gray and limit FPS to 60
+        # Limit FPS to 60 (or wait for the deadline or an input event) and cover everything in gray
+        events = pacer.wait(deadline)
         window.fill(GRAY)
-        clock.tick(60)
+        PROFILER.start_frame()
 
         # Get mouse position
         mouse_x, mouse_y = pygame.mouse.get_pos()
@@ -281,43 +292,43 @@ def main():
         if capturing and not captured:
             # Get frame from camera
             if MODE == 1:
-                _, image = CAMERA.read()
-
-            # Resize the image to make processing it easier
-            resized_image = cv2.resize(image, (width, height), cv2.INTER_AREA)
-
-            # Check if it's just a black screen
-            _, check_black = cv2.threshold(cv2.cvtColor(resized_image, cv2.COLOR_BGR2GRAY), 50, 255, cv2.THRESH_BINARY)
-            not_black = np.count_nonzero(check_black)
-            # Create a copy of the original image
-            computer_image = image.copy()
+                with PROFILER.span("capture"):
+                    # Read the frame into the same array as the previous frame
+                    _, image = CAMERA.read(image)
+
+            # Preprocess the image (resize, grayscale, blur and thresholding) and check if it's just a black screen
+            processed_image, not_black = preprocessor.run(image)
+            for stage, milliseconds in preprocessor.timings.items():
+                PROFILER.record("preprocess " + stage, milliseconds)
+            # Copy the original image into the same array as the previous frame
+            if computer_image.shape != image.shape or computer_image.dtype != image.dtype:
+                computer_image = np.empty_like(image)
+            np.copyto(computer_image, image)
             # Analyze image only if it's not an entire black screen
             if not_black:
-                # Preprocess the image (grayscale, blur and thresholding)
-                processed_image = preprocess(resized_image)
-                # Get the corners of the sheet (if it is detected)
-                sheet_corners, final_contour = get_sheet_corners(processed_image, width * height)
+                # Get the corners and the outline of every page (if any is detected) in reading order
+                with PROFILER.span("detect"):
+                    pages = find_pages(processed_image, width * height)
 
                 # Analyze image only once for a still image from a file
                 if MODE == 2:
                     captured = True
 
-                # If a big enough four-sided shape was detected
-                if sheet_corners.size != 0 and final_contour.size != 0:
-                    # Rescale the corners to fit with the camera display dimensions
-                    rescale(sheet_corners, width, height, CAMERA_WIDTH, CAMERA_HEIGHT)
-                    # Resize contour from the small resized image scale to the initial scale
-                    # All the x values of each point in the contour (index 0)
-                    final_contour[:, :, 0] = final_contour[:, :, 0] * initial_w / width
-                    # All the y values of each point in the contour (index 1)
-                    final_contour[:, :, 1] = final_contour[:, :, 1] * initial_h / height
-
-                if final_contour.size != 0 and computer_image.size != 0 and len(sheet_corners) == 4:
-                    # Draw the outline of the sheet on the computer image
-                    cv2.drawContours(computer_image, final_contour, -1, BLUE_BGR, round(LINE_WIDTH * initial_w / CAMERA_WIDTH))
+                # Rescale the corners to fit with the camera display dimensions
+                sheet_corners = rescale(as_quads([corners for corners, _ in pages]), width, height, CAMERA_WIDTH, CAMERA_HEIGHT)
+                # If big enough four-sided shapes were detected
+                if pages:
+                    # Resize the contours from the small resized image scale to the initial scale
+                    final_contours = [to_pixels(rescale(contour, width, height, initial_w, initial_h)) for _, contour in pages]
+                    # Draw the outline of every page on the computer image
+                    cv2.drawContours(computer_image, final_contours, -1, BLUE_BGR, round(LINE_WIDTH * initial_w / CAMERA_WIDTH))
 
                 # Create pygame image object from numpy array of computer image with contours drawn
-                computer_pygame_image = create_pygame_image(computer_image, CAMERA_WIDTH, CAMERA_HEIGHT)
+                if MODE == 2:
+                    # The still image is only analyzed once, keep its surface for when the user comes back to this step
+                    computer_pygame_image = surface_cache.surface(computer_image, CAMERA_WIDTH, CAMERA_HEIGHT)
+                else:
+                    computer_pygame_image = frame_surface.update(computer_image)
                 image_created = True
                 corners_copy = sheet_corners.copy()
 
@@ -330,42 +341,48 @@ def main():
                 if captured and corner_changed:
                     # If a new pygame image object has not yet been created, create a new one from the original image (no contours)
                     if not image_created:
-                        computer_pygame_image = create_pygame_image(image, CAMERA_WIDTH, CAMERA_HEIGHT)
+                        computer_pygame_image = surface_cache.surface(image, CAMERA_WIDTH, CAMERA_HEIGHT)
                         image_created = True
-                    pygame.draw.polygon(window, BLUE, corners_copy.reshape(4, 2), width=LINE_WIDTH)
+                    for page_corners in corners_copy:
+                        pygame.draw.polygon(window, BLUE, page_corners, width=LINE_WIDTH)
 
                 # If there are corners detected
                 if corners_copy.size != 0:
-                    for i in range(4):
-                        # Take each corner individually
-                        corner = corners_copy.reshape(4, 2)[i]
-                        # Check if user is clicking on the corner, click number from 1 to 4, value of 0 means no click
+                    # Corners of all the pages one after the other (a view, so changing a corner changes corners_copy)
+                    all_corners = corners_copy.reshape(-1, 2)
+                    for i, corner in enumerate(all_corners):
+                        # Check if user is clicking on the corner, click number from 1 to 4 for each page, value of 0 means no click
                         if click == i + 1:
                             # Update the corner's position to match the user's mouse
                             if mouse_x <= CAMERA_WIDTH:
-                                corners_copy.reshape(4, 2)[i][0] = mouse_x
-                            corners_copy.reshape(4, 2)[i][1] = mouse_y
+                                corner[0] = mouse_x
+                            corner[1] = mouse_y
                         # Draw green circle where the corner is
                         pygame.draw.circle(window, GREEN, corner, LINE_WIDTH * 3)
 
             elif analysing:
                 # Create warped image
                 if not image_created:
-                    if not rotation:
-                        # Scale the corners from their previous position (camera scale) to their initial scale (full resolution)
-                        rescale(corners_copy, CAMERA_WIDTH, CAMERA_HEIGHT, initial_w, initial_h)
-                        # Warp initial high quality image (not sized down) based on new rescaled corners
-                        warped_image = warp(image, corners_copy, initial_w, initial_h)
-                    # Create pygame image based on viewing scale
-                    final_image = create_pygame_image(warped_image, VIEWING_WIDTH, VIEWING_HEIGHT, rotation=rotation)
+                    # Scale the corners from their previous position (camera scale) to their initial scale (full resolution)
+                    full_corners = rescale(corners_copy, CAMERA_WIDTH, CAMERA_HEIGHT, initial_w, initial_h)
+                    # Warp all the pages of the initial high quality image (not sized down) at the same time based on
+                    # new rescaled corners (only done once for the same corners)
+                    with PROFILER.span("warp"):
+                        warped_pages = surface_cache.warp_pages(image, full_corners, initial_w, initial_h)
+                    # Create pygame image of the current page based on viewing scale (rotations reuse the downscaled surface)
+                    final_image = surface_cache.surface(warped_pages[page], VIEWING_WIDTH, VIEWING_HEIGHT, rotation=rotation)
                     # Only create the image once
                     image_created = True
                     pygame.display.set_mode((VIEWING_WIDTH + SPACING, VIEWING_HEIGHT))
                     window.fill(GRAY)
                 # Display image
                 window.blit(final_image, (0, 0))
+                # Tell the user which page is displayed when there is more than one
+                if len(warped_pages) > 1:
+                    display_text(window, FONT_32, "Page  {0} / {1}   (left / right)".format(page + 1, len(warped_pages)), BLUE,
+                                 VIEWING_WIDTH, VIEWING_HEIGHT, 1 / 4)
 
-            if len(corners_copy) == 4:
+            if len(corners_copy):
                 # If mouse is on the text, change the color
                 if hovering:
                     color = GREEN
@@ -406,21 +423,22 @@ def main():
             black_screen = pygame.Rect((0, 0), (CAMERA_WIDTH, CAMERA_HEIGHT))
             pygame.draw.rect(window, BLACK, black_screen)
 
+        # Draw the profiling statistics on top of everything
+        PROFILER.draw(window)
+
         # Check for events
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEBUTTONDOWN and not_black:
                 # If there are corners and the user is not clicking on anything
                 if capturing and corners_copy.size != 0 and not click and captured:
-                    for i in range(4):
-                        # Take each corner individually
-                        corner = corners_copy.reshape(4, 2)[i]
+                    for i, corner in enumerate(corners_copy.reshape(-1, 2)):
                         radius = LINE_WIDTH * 3
                         # Get the bounding rectangle of each corner's green circle and check for collision with the mouse
                         square = pygame.rect.Rect((corner[0] - radius, corner[1] - radius), (2 * radius, 2 * radius))
                         if square.collidepoint(mouse_x, mouse_y):
-                            # Register click as corner number (1 to 4, value of 0 means no click)
+                            # Register click as corner number (1 to 4 for each page, value of 0 means no click)
                             click = i + 1
                             # Tell next loop that a corner is being changed and tell it to create a new version of
                             # the pygame image object
@@ -451,6 +469,9 @@ def main():
                 # Escape or 'q' to quit
                 if event.key == pygame.K_ESCAPE or event.key == pygame.K_q:
                     running = False
+                # Show or hide the profiling statistics
+                elif event.key == pygame.K_F3:
+                    PROFILER.overlay = not PROFILER.overlay
                 elif event.key == pygame.K_r and not_black:
                     # Bring user back to viewing camera and capturing image
                     if captured and capturing and MODE == 1:
@@ -458,6 +479,8 @@ def main():
                         # Reset corners
                         corner_changed = False
                         corners_copy = sheet_corners.copy()
+                        # The camera frames are about to change, release the cached surfaces
+                        surface_cache.clear()
                     # Bring user back to cropping step
                     elif analysing:
                         analysing = False
@@ -466,22 +489,49 @@ def main():
                         corner_changed = False
                         corners_copy = sheet_corners.copy()
                         # Draw image that has all the contours drawn
-                        computer_pygame_image = create_pygame_image(computer_image, CAMERA_WIDTH, CAMERA_HEIGHT)
+                        computer_pygame_image = surface_cache.surface(computer_image, CAMERA_WIDTH, CAMERA_HEIGHT)
                         # Reset display dimensions to fit with camera dimensions
                         pygame.display.set_mode((CAMERA_WIDTH + SPACING, CAMERA_HEIGHT))
-                        # Reset number of rotations
+                        # Reset number of rotations and go back to the first page
                         rotation = 0
+                        page = 0
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT) and analysing and len(warped_pages) > 1:
+                    # Show the previous or the next page
+                    page = (page + (1 if event.key == pygame.K_RIGHT else -1)) % len(warped_pages)
+                    image_created = False
 
         # Update display
-        pygame.display.flip()
+        with PROFILER.span("flip"):
+            pygame.display.flip()
+        PROFILER.end_frame()
+
+        # The input is handled after drawing, so run the next frame right away to show what it changed (e.g.: ROTATE,
+        # left / right or 'r'), as well as when an image still has to be created
+        if events or not image_created and not_black:
+            deadline = pygame.time.get_ticks()
+        # Only the live camera (and the statistics) need every frame, everything else changes with the user's input
+        elif MODE == 1 and capturing and not captured or PROFILER.overlay:
+            deadline = pacer.frame_deadline()
+        else:
+            deadline = None
 
 
 if __name__ == "__main__":
+    import os
+    import sys
     import cv2
     import numpy as np
+    from collections import OrderedDict
+    from geometry import as_quads, rescale, to_pixels
+    from pages import find_pages, warp_pages
+    from preprocessing import Preprocessor
     import pygame
     import tkinter as tk
     from tkinter.filedialog import askopenfilename
+    # The profiler and the pacing are shared with PianoPlayer.py, which is in the parent folder
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pacing import Pacer
+    from profiler import Profiler
 
     # Initialize global variables
     # # # # # # #
@@ -501,6 +551,15 @@ if __name__ == "__main__":
     LINE_WIDTH = CAMERA_WIDTH // 120
     # Webcam number (usually 0 unless you have more than one webcam connected)
     WEBCAM_NUM = 0
+    # Number of surfaces and warps kept in memory to make going back and forth between steps instant
+    SURFACE_CACHE_SIZE = 4
+    # Time each stage of the main loop (F3 shows the statistics on screen)
+    PROFILE = False
+    # File where the statistics are saved when the program closes (.json or .csv)
+    PROFILE_DUMP = "profile.json"
+    PROFILER = Profiler(enabled=PROFILE)
+    # "fixed" redraws 60 times per second, "events" only redraws for new camera frames and for the user's input
+    PACING = "fixed"
     # # # # # # # # # # # # # # # # # # # # #
     # # # # # # #
 
@@ -546,6 +605,9 @@ if __name__ == "__main__":
             # Close webcam
             if MODE == 1:
                 CAMERA.release()
+            # Save the profiling statistics
+            if PROFILE:
+                PROFILER.dump(PROFILE_DUMP)
 
         pygame.quit()
 
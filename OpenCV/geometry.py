@@ -0,0 +1,35 @@
+import numpy as np
+
+
+# Convert any array of quadrilaterals into a float array of shape (number of quadrilaterals, 4 corners, x and y)
+# Accepts a single quadrilateral in the OpenCVfolder format (4, 1, 2) as well as (4, 2), (n, 4, 2) and (n, 4, 1, 2)
+def as_quads(points):
+    return np.asarray(points, dtype=np.float64).reshape((-1, 4, 2))
+
+
+# Reorder the corners of every quadrilateral (top left, top right, bottom left, bottom right)
+# Returns a new array of shape (n, 4, 2), the input is never modified
+def reorder(points):
+    quads = as_quads(points)
+    # Sum of each point (adds x pixel value of point to y value)
+    points_sum = quads.sum(axis=2)
+    # Difference of each point (subtracts x pixel value of point from y value)
+    points_difference = quads[:, :, 1] - quads[:, :, 0]
+    # Index of each corner for every quadrilateral at once
+    # The minimum sum corresponds to the top left corner and the maximum sum to the bottom right corner
+    # The minimum difference corresponds to the top right corner and the maximum difference to the bottom left corner
+    indices = np.stack([points_sum.argmin(axis=1), points_difference.argmin(axis=1),
+                        points_difference.argmax(axis=1), points_sum.argmax(axis=1)], axis=1)
+    # Pick the corners of each quadrilateral in the right order
+    return np.take_along_axis(quads, indices[:, :, np.newaxis], axis=1)
+
+
+# Scale points from one image size to another (e.g.: from the processed image to the full resolution image)
+# Works on any array whose last dimension holds x and y, returns a new float array of the same shape
+def rescale(points, width, height, final_width, final_height):
+    return np.asarray(points, dtype=np.float64) * (final_width / width, final_height / height)
+
+
+# Round points to the nearest pixel for the OpenCVfolder functions that only accept integer coordinates
+def to_pixels(points):
+    return np.rint(points).astype(np.int32)
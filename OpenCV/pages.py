@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from geometry import as_quads, reorder
+
+# Maximum number of pages kept from a single frame (e.g.: two facing pages of a bound book)
+MAX_PAGES = 4
+# A page is dropped if this fraction of its area is already covered by a bigger page
+MAX_OVERLAP = 0.2
+
+
+# Find every quadrilateral in the processed image that could be a page
+# Returns a list of (corners, contour) pairs in reading order (left to right, then top to bottom)
+def find_pages(image, total_area, max_pages=MAX_PAGES, max_overlap=MAX_OVERLAP):
+    candidates = []
+    # Get all the outline of the objects that OpenCVfolder detects
+    contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    # For each contour
+    for contour in contours:
+        # Get the surface area
+        area = cv2.contourArea(contour)
+        # Check if surface area is big enough (this ignores all the tiny bits that we don't need)
+        if area > total_area // 8:
+            # Get perimeter of the shape detected by OpenCVfolder
+            perimeter = cv2.arcLength(contour, True)
+            # Allow difference of 10% from predicted perimeter (perimeter of a perfect polygon
+            # that closely matches the shape detected in the image)
+            approximation = cv2.approxPolyDP(contour, 0.1 * perimeter, True)
+            # Only retain 4 sided shapes
+            if len(approximation) == 4:
+                candidates.append((area, approximation, contour))
+
+    # Rank the pages from the biggest to the smallest and drop the ones that mostly cover a bigger page
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    pages = []
+    for area, approximation, contour in candidates:
+        polygon = np.float32(approximation.reshape((4, 2)))
+        if all(overlap(polygon, kept, area) <= max_overlap for kept, _, _ in pages):
+            pages.append((polygon, approximation, contour))
+            if len(pages) == max_pages:
+                break
+
+    # Function returns the corners and the contour of each page in reading order
+    return [(approximation, contour) for _, approximation, contour in reading_order(pages)]
+
+
+# Fraction of the polygon's area that is covered by another polygon
+def overlap(polygon, other, area):
+    # The approximations are usually convex, only compare convex shapes (hulls) so that OpenCVfolder can intersect them
+    intersection, _ = cv2.intersectConvexConvex(cv2.convexHull(polygon), cv2.convexHull(other))
+    return intersection / area if area else 0
+
+
+# Sort the pages in rows (top to bottom) and each row from left to right
+def reading_order(pages):
+    rows = []
+    # Go through the pages from top to bottom
+    for page in sorted(pages, key=lambda page: page[0][:, 1].mean()):
+        top, bottom = page[0][:, 1].min(), page[0][:, 1].max()
+        # A page belongs to the previous row if its center is between the top and the bottom of that row
+        center = (top + bottom) / 2
+        if rows and rows[-1][0] <= center <= rows[-1][1]:
+            rows[-1][2].append(page)
+        else:
+            rows.append([top, bottom, [page]])
+    return [page for _, _, row in rows for page in sorted(row, key=lambda page: page[0][:, 0].mean())]
+
+
+def warp(image, sheet_corners, width, height):
+    # Get the correct order for all four corners and convert them into numpy float format
+    points1 = np.float32(reorder(sheet_corners)[0])
+    # Set the final position of each corner (the corners of the window)
+    points2 = np.float32([[0, 0], [width, 0], [0, height], [width, height]])
+    # Calculates by how much to warp each of the four sides
+    matrix = cv2.getPerspectiveTransform(points1, points2)
+    # Warp the image based on the perspective matrix
+    processed = cv2.warpPerspective(image, matrix, (width, height))
+    # Function returns warped image OpenCVfolder object
+    return processed
+
+
+# Warp every page at the same time (OpenCVfolder releases the GIL while warping)
+# Returns the warped pages in the same order as the corners (reading order)
+def warp_pages(image, pages_corners, width, height):
+    quads = as_quads(pages_corners)
+    if len(quads) < 2:
+        return [warp(image, quad, width, height) for quad in quads]
+    with ThreadPoolExecutor(max_workers=len(quads)) as executor:
+        return list(executor.map(lambda quad: warp(image, quad, width, height), quads))
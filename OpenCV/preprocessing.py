@@ -0,0 +1,77 @@
+import time
+
+import cv2
+import numpy as np
+
+# Stages of the preprocessing pipeline in the order that they run
+STAGES = ("resize", "grayscale", "black_check", "blur", "threshold")
+
+
+# Resize, grayscale, blur and threshold every frame while reusing the same buffers
+# The buffers are only allocated again if the resolution of the frames changes
+class Preprocessor:
+    def __init__(self, width, height, black_threshold=50, passes=2):
+        # Dimensions of the image to process (original image downscaled)
+        self.width = width
+        self.height = height
+        # Any pixel brighter than this value means that the frame is not entirely black
+        self.black_threshold = black_threshold
+        # Number of times the blur and the threshold are applied
+        self.passes = passes
+        # Shape of the frames the buffers were allocated for
+        self.shape = None
+        self.resized = None
+        self.gray = None
+        self.blurred = None
+        self.processed = None
+        # Duration in milliseconds of each stage for the last frame
+        self.timings = dict.fromkeys(STAGES, 0.0)
+
+    def allocate(self, shape):
+        self.shape = shape
+        self.resized = np.empty((self.height, self.width, shape[2]), np.uint8)
+        self.gray = np.empty((self.height, self.width), np.uint8)
+        self.blurred = np.empty((self.height, self.width), np.uint8)
+        self.processed = np.empty((self.height, self.width), np.uint8)
+
+    def run(self, image):
+        # Only allocate the buffers for the first frame or when the resolution changes
+        if image.shape != self.shape:
+            self.allocate(image.shape)
+        timings = self.timings
+        start = time.perf_counter()
+
+        # Resize the image to make processing it easier
+        cv2.resize(image, (self.width, self.height), dst=self.resized, interpolation=cv2.INTER_AREA)
+        resized_time = time.perf_counter()
+        timings["resize"] = (resized_time - start) * 1000
+
+        # Convert image to grayscale so it's easier process for the computer
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        gray_time = time.perf_counter()
+        timings["grayscale"] = (gray_time - resized_time) * 1000
+
+        # Check if it's just a black screen directly from the grayscale image (any pixel above the threshold)
+        not_black = int(self.gray.max()) > self.black_threshold
+        check_time = time.perf_counter()
+        timings["black_check"] = (check_time - gray_time) * 1000
+        timings["blur"] = timings["threshold"] = 0.0
+        # Don't bother processing an entirely black frame
+        if not not_black:
+            return None, False
+
+        source = self.gray
+        for _ in range(self.passes):
+            # Blur the image so that only the most important details remain
+            cv2.GaussianBlur(source, (9, 9), 5, dst=self.blurred)
+            blur_time = time.perf_counter()
+            timings["blur"] += (blur_time - check_time) * 1000
+            # Use an adaptive threshold to separate the music sheet from the background
+            cv2.adaptiveThreshold(self.blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 101, 1,
+                                  dst=self.processed)
+            check_time = time.perf_counter()
+            timings["threshold"] += (check_time - blur_time) * 1000
+            # The next pass starts from the thresholded image
+            source = self.processed
+        # Function returns the final processed image (reused on the next frame) and whether the frame is not black
+        return self.processed, True
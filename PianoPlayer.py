@@ -1,5 +1,17 @@
+import heapq
+import math
+import os
+from bisect import bisect_left, bisect_right
+
 import pygame
 
+import timing_log
+from mixer import PygameSink, SoftwareMixer, from_float, load_sample, to_float
+from pacing import Pacer
+from profiler import Profiler
+from samples import KEY_PATTERN, SampleBank, key_number
+from score import ALTERNATING_CHANNELS, CHANNELS_PER_TRACK
+
 # Initialize pygame
 pygame.init()
 
@@ -24,11 +36,84 @@ HEIGHT = MON_H // 4 - SPACING
 FADE = 5
 NOTE_FADE = 200
 DELAY = 1000
-OCCUPIED_CHANNELS = [0, 1, 2, 3, 4, 5, 6, 7]
+# Time each stage of the main loop and count the notes that played late (F3 shows the statistics on screen)
+PROFILE = False
+# File where the statistics are saved when the program closes (.json or .csv)
+PROFILE_DUMP = "profile.json"
+PROFILER = Profiler(enabled=PROFILE)
+# Record when every note-on, fade and silence was scheduled and when it happened (python timing_log.py FILE analyzes it)
+TIMING = False
+# File where the timing log is saved when the program closes (.csv, or .npy for the binary format)
+TIMING_DUMP = "timing.npy"
+TIMING_LOG = timing_log.TimingLog(enabled=TIMING)
+# "fixed" redraws 60 times per second, "events" sleeps until the next note, fade or input event (almost no CPU when idle)
+PACING = "fixed"
+# Show the notes falling towards the keyboard (each note reaches the keyboard when it starts playing)
+PIANO_ROLL = False
+# Milliseconds of music shown above the keyboard
+ROLL_WINDOW = 3000
+
+# Mix the notes with the software mixer instead of the pygame channels (click-free fades and no limit on the number of
+# notes playing at the same time)
+SOFTWARE_MIXER = False
+# Number of samples mixed at once by the software mixer (smaller means less latency but more work)
+BLOCK_SIZE = 512
+MIXER = SoftwareMixer(PygameSink(), block_size=BLOCK_SIZE) if SOFTWARE_MIXER else None
+
+
+# Get the sound channel with that number from whichever mixer plays the notes
+def get_channel(number):
+    if MIXER:
+        return MIXER.Channel(number)
+    return pygame.mixer.Channel(number)
+
+
+# Create the first sound channels (you can only play one sound at a time in a channel)
+def create_channels(count):
+    if not MIXER:
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), count))
+    for number in range(count):
+        globals()["channel_{0}".format(number)] = get_channel(number)
+
+
+# Only keep every Nth semitone in memory and derive the other notes by resampling the closest one (1 keeps every note)
+SAMPLE_STEP = 1
+# Compressed samples made by trimmer.py (e.g.: "data.zip", None plays the wav files of the data folder)
+# The notes of the piece are decompressed in the background, in the order they play, so the program starts right away
+SAMPLE_PACK = None
+# Notes without a sample file (e.g.: "Db8" or "Cb4") are also derived from the closest note
+# The notes are only kept in the format the mixer plays (pygame sounds are read back as a view of their samples)
+if MIXER:
+    BANK = SampleBank(SAMPLE_PACK or "data", step=SAMPLE_STEP, convert=to_float, revert=from_float)
+else:
+    BANK = SampleBank(SAMPLE_PACK or "data", step=SAMPLE_STEP, revert=pygame.sndarray.samples,
+                      convert=lambda samples: pygame.sndarray.make_sound(samples.copy(order="C")))
+
+
+# Load a note in the format expected by whichever mixer plays the notes
+def load_sound(key):
+    path = os.path.join("data", "{0}.wav".format(key))
+    # Compressed notes are decoded in the background once the whole piece is known
+    if SAMPLE_PACK:
+        return None
+    # With a sparse sample set, only the closest resident note is loaded, the note itself is derived when it plays
+    if SAMPLE_STEP > 1:
+        BANK.load([key])
+        return None
+    # Derive the notes that don't have a sample
+    if not os.path.exists(path):
+        return BANK.get(key)
+    if MIXER:
+        return load_sample(path)
+    return pygame.mixer.Sound(path)
+
+
+# Get the sound of a note that was loaded with load_sound
+def get_sound(key):
+    if SAMPLE_STEP > 1 or SAMPLE_PACK:
+        return BANK.get(key)
+    return globals()[key]
 
-# Create 8 pygame sound channels (you can only play one sound at a time in a channel)
-for i in range(8):
-    globals()["channel_{0}".format(i)] = pygame.mixer.Channel(i)
 
 # ALL OF THE GLOBAL VARIABLES BELOW ARE DETERMINED BY USER INPUT OR IMAGE RECOGNITION
 # Tempo in beats per minute
@@ -49,12 +134,15 @@ class N:
         self.key = key
         self.value = value
         self.articulation = articulation
-        self.hand = 0
+        self.track = 0
         self.beat_num = 0
         self.played = False
         self.pedal = pedal
         self.faded = False
         self.channel = channel
+        # Bar of the note and number of semitones of its key (used by the timing log)
+        self.bar = 0
+        self.pitch = key_number(key) if type(key) == str and KEY_PATTERN.match(key) else -1
 
     def play(self, start_time):
         # Get current ticks
@@ -65,25 +153,32 @@ class N:
         if self.key and elapsed >= self.beat_num * DURATION + DELAY:
             # If the pedal is not applied (which keeps the notes from stopping), fade the note out
             if not self.pedal:
-                # If the note has been played and its time is passed and the articulation is staccato, fade the note out quickly
-                # Or if the note is a silence that has not been played yet, fade out the channels corresponding to the note
-                if self.articulation[0] != "l" and elapsed >= (self.beat_num + min_val / self.value - 1) * DURATION + DELAY \
-                        or self.articulation[0] == "l" and elapsed >= (self.beat_num + min_val / self.value) * DURATION + DELAY:
-                    if self.played and not self.faded:
-                        if not self.channel:
-                            # Quickly fade this note only
-                            channel = globals()["channel_{0}".format((self.beat_num % 2) + 4 * self.hand)]
-                        # If a channel is specified, fade out that channel only
-                        else:
-                            channel = pygame.mixer.Channel(self.channel)
-                        channel.fadeout(NOTE_FADE)
-                        # Keep track of when a note has already been faded out so that the channel doesn't fade out all other notes
-                        self.faded = True
-                elif self.key == "s" and not self.played:
-                    # Quickly fade all notes on the channels that correspond to that hand
-                    for n in range(4):
-                        channel = globals()["channel_{0}".format(4 * self.hand + n)]
+                end = self.end_time()
+                # If the note has been played and its time is passed, fade the note out quickly
+                if elapsed >= end and self.played and not self.faded:
+                    if not self.channel:
+                        # Quickly fade this note only
+                        number = self.track_channel()
+                        channel = globals()["channel_{0}".format(number)]
+                    # If a channel is specified, fade out that channel only
+                    else:
+                        number = self.channel
+                        channel = get_channel(number)
+                    channel.fadeout(NOTE_FADE)
+                    # The actual time is read right after the fade started
+                    TIMING_LOG.record(timing_log.FADE, end, TIMING_LOG.elapsed(), number, self.pitch, self.bar,
+                                      self.track)
+                    # Keep track of when a note has already been faded out so that the channel doesn't fade out all other notes
+                    self.faded = True
+                # If the note is a silence that has not been played yet, fade out the channels corresponding to the track
+                # (checked even when its end is passed: a staccato silence of the shortest value ends when it starts)
+                if self.key == "s" and not self.played:
+                    # Quickly fade all notes on the channels that correspond to that track
+                    for n in range(CHANNELS_PER_TRACK):
+                        channel = globals()["channel_{0}".format(CHANNELS_PER_TRACK * self.track + n)]
                         channel.fadeout(NOTE_FADE)
+                    TIMING_LOG.record(timing_log.SILENCE, self.beat_num * DURATION + DELAY, TIMING_LOG.elapsed(),
+                                      bar=self.bar, track=self.track)
                     # If the silence was just played, update its played value
                     if self.key == "s":
                         self.played = True
@@ -102,45 +197,79 @@ class N:
                         break
                 # If a channel is specified, set the sound to play on it and reset its availability so other cords can make use of it
                 if self.channel:
-                    channel = pygame.mixer.Channel(self.channel)
+                    number = self.channel
+                    channel = get_channel(number)
                     if elapsed >= (self.beat_num + min_val / self.value) * DURATION + DELAY:
                         try:
                             OCCUPIED_CHANNELS.remove(self.channel)
                         except ValueError:
                             pass
-                elif not self.pedal:
-                    # Calculate which channel to play the note in (each channel is responsible for half the notes)
-                    channel = globals()["channel_{0}".format((self.beat_num % 2) + 4 * self.hand)]
                 else:
-                    # When the pedal is pressed, there are four channels on which the notes play, so each note stays longer
-                    channel = globals()["channel_{0}".format((self.beat_num % 4) + 4 * self.hand)]
+                    # Calculate which channel of the track to play the note in
+                    number = self.track_channel()
+                    channel = globals()["channel_{0}".format(number)]
                 # Stop any sound playing on this channel
                 channel.stop()
                 # Play the current note
-                channel.play(globals()[self.key])
+                channel.play(get_sound(self.key))
+                # When the note actually started (after looking up the key and stopping the previous note)
+                actual = TIMING_LOG.elapsed()
+                # Keep track of how late the note started compared to when it was supposed to
+                PROFILER.deadline("onset", self.beat_num * DURATION + DELAY, elapsed)
+                TIMING_LOG.record(timing_log.NOTE_ON, self.beat_num * DURATION + DELAY, actual, number, self.pitch, self.bar,
+                                  self.track)
                 # Append the note to a list so that the program doesn't play it again
                 self.played = True
 
+    # Channel of the track the note plays in: the notes alternate between half the channels of the track, or between
+    # all of them when the pedal is pressed (so that each note stays longer)
+    def track_channel(self):
+        channels = CHANNELS_PER_TRACK if self.pedal else ALTERNATING_CHANNELS
+        return self.beat_num % channels + CHANNELS_PER_TRACK * self.track
+
+    # Milliseconds after the start when the note is faded (staccato notes end one beat earlier than legato notes)
+    def end_time(self):
+        return (self.beat_num + min_val / self.value - (self.articulation[0] != "l")) * DURATION + DELAY
+
+    # Milliseconds after the start when this note has something to do next (None when it is finished)
+    # play always does that something once the time is passed, so the scheduler never waits on a time in the past
+    def next_time(self):
+        if self.finished():
+            return None
+        if not self.played:
+            return self.beat_num * DURATION + DELAY
+        return self.end_time()
+
+    # Nothing is left to do for this note (notes and silences are not faded when the pedal is pressed)
+    def finished(self):
+        if not self.key or self.key == "s" and self.pedal:
+            return True
+        return self.played and (self.faded or self.pedal)
+
 
 class Chord:
     def __init__(self, notes, value, articulation=ARTICULATION, pedal=False):
         # Same variable names as class N
         self.beat_num = 0
         self.pedal = pedal
-        self.key = []
+        self.track = 0
         self.channel = 0
         self.value = value
-        # Create an N object for each note of the chord
-        for n, key in enumerate(notes):
+        # Create an N object for each note of the chord (their channels are chosen once all the tracks are known)
+        self.key = [N(key, value, articulation, pedal=self.pedal) for key in notes]
+
+    # Give each note of the chord a channel that no track or other chord uses
+    def allocate_channels(self):
+        for note in self.key:
             # Find unoccupied channels
             while self.channel in OCCUPIED_CHANNELS:
                 self.channel += 1
-            # Append the N object to the list of keys
-            self.key.append(N(key, value, articulation, channel=self.channel, pedal=self.pedal))
+            note.channel = self.channel
+            note.pedal = self.pedal
             # Update the list of occupied channels
             OCCUPIED_CHANNELS.append(self.channel)
         # Set number of channels to accommodate the extra channels
-        pygame.mixer.set_num_channels(self.channel + 1)
+        create_channels(self.channel + 1)
 
     # Same definition name as class N
     def play(self, start_time):
@@ -150,75 +279,151 @@ class Chord:
             # Play each note
             key.play(start_time)
 
+    def next_time(self):
+        return min((time for time in (key.next_time() for key in self.key) if time is not None), default=None)
+
+    def finished(self):
+        return all(key.finished() for key in self.key)
+
 
-# Notes to play in channels 1 and 2 in regular legato and staccato (index 0 and 1), corresponds to right hand
-# Notes play also in channels 1 to 4 (index 0 to 3) when the pedal is pressed. That way, each note can play longer before fading out
-# The notes lists are lists of bars, which are themselves lists of notes. That way, we can keep track of when the pedal is pressed
-NOTES_0 = [[N("E5", 16), N("Eb5", 16)],
-           [N("E5", 16), N("Eb5", 16), N("E5", 16), N("B4", 16), N("D5", 16), N("C5", 16)],
-           [N("A4", 8), N("s", 16), N("C4", 16), N("E4", 16), N("A4", 16)],
-           [N("B4", 8), N("s", 16), N("E4", 16), N("Ab4", 16), N("B4", 16)],
-           [N("C5", 8), N("s", 16), N("E4", 16), N("E5", 16), N("Eb5", 16)],
-           [N("E5", 16), N("Eb5", 16), N("E5", 16), N("B4", 16), N("D5", 16), N("C5", 16)],
-           [N("A4", 8), N("s", 16), N("C4", 16), N("E4", 16), N("A4", 16)],
-           [N("B4", 8), N("s", 16), N("E4", 16), N("C5", 16), N("B4", 16)],
-           [N("A4", 4)]]
-# Notes to play in channels 5 and 6 in regular legato and staccato (index 4 and 5), corresponds to left hand
-# Notes play also in channels 5 to 8 (index 4 to 7) when the pedal is pressed. That way, each note can play longer before fading out
-NOTES_1 = [[N("s", 8)],
-           [N("s", TIME_SIGNATURE_BOTTOM / TIME_SIGNATURE_TOP)],
-           [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
-           [N("E2", 16), N("E3", 16), N("Ab3", 16), N("s", 16), N("s", 8)],
-           [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
-           [N("s", TIME_SIGNATURE_BOTTOM / TIME_SIGNATURE_TOP)],
-           [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
-           [N("E2", 16), N("E3", 16), N("Ab3", 16), N("s", 16), N("s", 8)],
-           [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16)]]
-# Bars during which the pedal is applied (keeps the notes playing)
-PEDAL_BARS = [2, 3, 4, 6, 7, 8]
+# Part of the piece played on its own channels with its own pedal (e.g.: one hand, or one player of a duet)
+class Track:
+    def __init__(self, bars, pedal_bars=()):
+        # List of bars, which are themselves lists of notes. That way, we can keep track of when the pedal is pressed
+        self.bars = bars
+        # Bars during which the pedal is applied (keeps the notes playing)
+        self.pedal_bars = set(pedal_bars)
+
+    def notes(self):
+        return [note_obj for bar in self.bars for note_obj in bar]
+
+
+# Starts the notes of every track when they are due and keeps checking them until they are faded
+# Each track is already in order, so the next note of the piece is always the first of one of the tracks: a heap holding
+# the next note of each track merges them (k-way merge), and each frame only looks at the notes that are due or playing
+class Scheduler:
+    def __init__(self, tracks):
+        self.tracks = [track.notes() for track in tracks]
+        # (beat of the next note of a track, track number, index of that note)
+        self.upcoming = [(notes[0].beat_num, number, 0) for number, notes in enumerate(self.tracks) if notes]
+        heapq.heapify(self.upcoming)
+        # Notes that started and still have something to do (a fade)
+        self.active = []
+
+    def play(self, start_time):
+        elapsed = pygame.time.get_ticks() - start_time
+        # Move every note that is due to the active notes and put the next note of its track in the heap
+        while self.upcoming and self.upcoming[0][0] * DURATION + DELAY <= elapsed:
+            _, number, index = self.upcoming[0]
+            self.active.append(self.tracks[number][index])
+            if index + 1 < len(self.tracks[number]):
+                heapq.heapreplace(self.upcoming, (self.tracks[number][index + 1].beat_num, number, index + 1))
+            else:
+                heapq.heappop(self.upcoming)
+        if self.active:
+            for note_object in self.active:
+                note_object.play(start_time)
+            self.active = [note_object for note_object in self.active if not note_object.finished()]
+
+    def next_deadline(self, start_time):
+        # Ticks at which the next note starts or an active note has to be faded (None once the piece is over)
+        times = [time for time in (note_object.next_time() for note_object in self.active) if time is not None]
+        if self.upcoming:
+            times.append(self.upcoming[0][0] * DURATION + DELAY)
+        return start_time + math.ceil(min(times)) if times else None
+
+    def done(self):
+        return not self.upcoming and not self.active
+
+
+# Tracks of the piece, each track plays on its own channels: channels 1 and 2 of the track in regular legato and
+# staccato, channels 1 to 4 when the pedal is pressed. That way, each note can play longer before fading out
+# First track: right hand (channels 1 to 4, index 0 to 3), second track: left hand (channels 5 to 8, index 4 to 7)
+TRACKS = [Track([[N("E5", 16), N("Eb5", 16)],
+                 [N("E5", 16), N("Eb5", 16), N("E5", 16), N("B4", 16), N("D5", 16), N("C5", 16)],
+                 [N("A4", 8), N("s", 16), N("C4", 16), N("E4", 16), N("A4", 16)],
+                 [N("B4", 8), N("s", 16), N("E4", 16), N("Ab4", 16), N("B4", 16)],
+                 [N("C5", 8), N("s", 16), N("E4", 16), N("E5", 16), N("Eb5", 16)],
+                 [N("E5", 16), N("Eb5", 16), N("E5", 16), N("B4", 16), N("D5", 16), N("C5", 16)],
+                 [N("A4", 8), N("s", 16), N("C4", 16), N("E4", 16), N("A4", 16)],
+                 [N("B4", 8), N("s", 16), N("E4", 16), N("C5", 16), N("B4", 16)],
+                 [N("A4", 4)]],
+                pedal_bars=[2, 3, 4, 6, 7, 8]),
+          Track([[N("s", 8)],
+                 [N("s", TIME_SIGNATURE_BOTTOM / TIME_SIGNATURE_TOP)],
+                 [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
+                 [N("E2", 16), N("E3", 16), N("Ab3", 16), N("s", 16), N("s", 8)],
+                 [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
+                 [N("s", TIME_SIGNATURE_BOTTOM / TIME_SIGNATURE_TOP)],
+                 [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16), N("s", 8)],
+                 [N("E2", 16), N("E3", 16), N("Ab3", 16), N("s", 16), N("s", 8)],
+                 [N("A2", 16), N("E3", 16), N("A3", 16), N("s", 16)]],
+                pedal_bars=[2, 3, 4, 6, 7, 8])]
+
+# Create the sound channels of every track, the chords use the channels after them
+OCCUPIED_CHANNELS = list(range(CHANNELS_PER_TRACK * len(TRACKS)))
+create_channels(len(OCCUPIED_CHANNELS))
 
 # Initialize minimum value variable
 min_val = 0
-# For both the hands
-for i in range(2):
+# For every track
+for i, track in enumerate(TRACKS):
     # Get one bar at a time
-    for ind, bar in enumerate(globals()["NOTES_{0}".format(i)]):
+    for ind, bar in enumerate(track.bars):
         # Get each note in that bar
         for note_obj in bar:
-            # Set the hand value (useful for determining the channel to play on)
-            note_obj.hand = i
+            # Set the track number (useful for determining the channel to play on) and the bar number
+            note_obj.track = i
+            note_obj.bar = ind
             # Update minimum value
             if note_obj.value > min_val:
                 min_val = note_obj.value
             # Update pedal variable for that note
-            if ind in PEDAL_BARS:
+            if ind in track.pedal_bars:
                 note_obj.pedal = True
+            # The notes of the chords play on the channels that are left
+            if type(note_obj.key) == list:
+                note_obj.allocate_channels()
+                for note in note_obj.key:
+                    note.track = i
+                    note.bar = ind
 # Calculate duration in milliseconds of the shortest note in the piece
 DURATION = round(TIME_SIGNATURE_BOTTOM / min_val * BEAT_DURATION)
 
-# For both of the hands
-for i in range(2):
-    # Reset the beat count for each hand
+# For every track
+for track in TRACKS:
+    # Reset the beat count for each track
     beat = 0
-    # Take each bar at a time
-    for bar in globals()["NOTES_{0}".format(i)]:
-        # Take each note
-        for note_obj in bar:
-            # Set the start time of that note as the current beat number
-            note_obj.beat_num = beat
-            # Add a beat
-            beat += 1
-            # If the value of the current note is not the minimum value, add beats according to note length
-            if note_obj.value != min_val:
-                for _ in range(round(min_val / note_obj.value - 1)):
-                    beat += 1
-            # Load the notes for the two hands
-            if note_obj.key and note_obj.key != "s":
-                if type(note_obj.key) != list:
-                    globals()[note_obj.key] = pygame.mixer.Sound("data\\{0}.wav".format(note_obj.key))
-                else:
-                    for note in note_obj.key:
-                        globals()[note.key] = pygame.mixer.Sound("data\\{0}.wav".format(note.key))
+    # Take each note
+    for note_obj in track.notes():
+        # Set the start time of that note as the current beat number
+        note_obj.beat_num = beat
+        # Add a beat
+        beat += 1
+        # If the value of the current note is not the minimum value, add beats according to note length
+        if note_obj.value != min_val:
+            for _ in range(round(min_val / note_obj.value - 1)):
+                beat += 1
+        # Load the notes of every track
+        if note_obj.key and note_obj.key != "s":
+            if type(note_obj.key) != list:
+                globals()[note_obj.key] = load_sound(note_obj.key)
+            else:
+                for note in note_obj.key:
+                    globals()[note.key] = load_sound(note.key)
+
+# With a sparse sample set or a compressed pack, decode, derive and convert the notes of the piece in the background in
+# the order they play, instead of on the main loop when they start playing
+if SAMPLE_STEP > 1 or SAMPLE_PACK:
+    first_notes = []
+    for track in TRACKS:
+        for note_obj in track.notes():
+            # Chords are lists of notes
+            for note in note_obj.key if type(note_obj.key) == list else [note_obj]:
+                if note.key and note.key != "s":
+                    first_notes.append((note_obj.beat_num, note.key))
+    first_notes.sort()
+    BANK.decode_ahead(key for _, key in first_notes)
 
 
 # Each drawn note has attributes (to keep track of fades and to see which note is currently playing, etc)
@@ -304,6 +509,64 @@ for i, note in enumerate(NOTE_NAMES):
         NOTES.append(Note(note_name, note, color, 52))
 
 
+# Falling notes drawn above the keyboard, at the same x position and with the same width as their key
+# The notes are sorted by start time, and since no note is longer than the longest one, the notes that can be on the
+# screen are found with two binary searches: each frame only looks at the notes inside the visible time window
+class PianoRoll:
+    def __init__(self, tracks, top, bottom, window=ROLL_WINDOW):
+        self.top = top
+        self.bottom = bottom
+        self.window = window
+        keys = {note_object.key: note_object for note_object in NOTES}
+        rows = []
+        for track in tracks:
+            for note_obj in track.notes():
+                # Chords are lists of notes, silences have no key to draw
+                for note in note_obj.key if type(note_obj.key) == list else [note_obj]:
+                    if note.key in keys:
+                        start = note_obj.beat_num * DURATION + DELAY
+                        rows.append((start, start + min_val / note_obj.value * DURATION, keys[note.key]))
+        rows.sort(key=lambda row: row[0])
+        # Start and end of each note in milliseconds
+        self.starts = [row[0] for row in rows]
+        self.ends = [row[1] for row in rows]
+        self.max_duration = max((end - start for start, end, _ in rows), default=0)
+        # x position of each note and whether it is a natural note (white key)
+        self.positions = [(SPACING + int((row[2].number - 1) * WIDTH), len(row[2].key_type) == 1) for row in rows]
+        # One tall rectangle per key type, the notes are parts of it (all of them are drawn in a single blits call)
+        self.sources = {True: pygame.Surface((WIDTH, bottom - top)), False: pygame.Surface((2 * WIDTH // 3, bottom - top))}
+        self.sources[True].fill(LIGHT_BLUE)
+        self.sources[False].fill(DARK_BLUE)
+
+    def visible(self, elapsed):
+        # Notes that start before the end of the window and end after its start
+        first = bisect_left(self.starts, elapsed - self.max_duration)
+        last = bisect_right(self.starts, elapsed + self.window)
+        return [i for i in range(first, last) if self.ends[i] > elapsed]
+
+    def draw(self, surface, elapsed):
+        # Pixels per millisecond
+        scale = (self.bottom - self.top) / self.window
+        natural = []
+        accidental = []
+        for i in self.visible(elapsed):
+            # Notes that are playing go into the keyboard, notes that start after the window come from above the screen
+            bottom = min(self.bottom, self.bottom - round((self.starts[i] - elapsed) * scale))
+            top = max(self.top, self.bottom - round((self.ends[i] - elapsed) * scale))
+            if bottom - top < 2:
+                continue
+            x, white = self.positions[i]
+            source = self.sources[white]
+            # Leave a pixel between two notes of the same key
+            area = (0, 0, source.get_width(), bottom - top - 1)
+            if white:
+                natural.append((source, (x, top), area))
+            else:
+                accidental.append((source, (x, top), area))
+        # Black notes are drawn over the white notes, like the keys
+        surface.blits(natural + accidental, doreturn=False)
+
+
 # Top right X button to close program
 def close_button(button_color):
     # Create rectangle
@@ -318,46 +581,65 @@ def close_button(button_color):
 def main():
     # Keep track of time
     initial_time = pygame.time.get_ticks()
-    # Keep track of frames per second
-    clock = pygame.time.Clock()
+    # The timing log measures the actual times from the same moment, with a finer clock
+    TIMING_LOG.start()
+    # Keep track of frames per second (or sleep until something has to happen)
+    pacer = Pacer(PACING)
+    # Ticks at which the next frame has to run (the first frame runs right away)
+    deadline = initial_time
     # Initialize local variables
     closed = False
+    piece_over = False
+    # Only the notes that are due or still playing are checked every frame
+    scheduler = Scheduler(TRACKS)
+    # Falling notes between the top of the screen and the keyboard
+    roll = PianoRoll(TRACKS, 0, 3 * MON_H // 4) if PIANO_ROLL else None
 
     # Main loop
     run = True
     while run:
-        # 60 frames per second
-        clock.tick(60)
+        # 60 frames per second, or wait for the deadline or an input event
+        events = pacer.wait(deadline)
+        PROFILER.start_frame()
         # Cover the previous frame with black
         WIN.fill(BLACK)
         # Get mouse position
         mouse_x, mouse_y = pygame.mouse.get_pos()
 
         # Play the notes if it is time and update played notes list
-        for n in range(2):
-            for single_bar in globals()["NOTES_{0}".format(n)]:
-                for note_object in single_bar:
-                    note_object.play(initial_time)
-
-        # Draw all white notes first (otherwise half of the black notes would be covered)
-        for note_object in NOTES:
-            if len(note_object.key_type) == 1:
-                note_object.draw_note()
-        # Draw all the black notes over the white notes
-        for note_object in NOTES:
-            if len(note_object.key_type) == 2:
-                note_object.draw_note()
+        with PROFILER.span("schedule"):
+            scheduler.play(initial_time)
+        # Shrink the sample cache back to its usual size once the piece is over
+        if not piece_over and scheduler.done():
+            piece_over = True
+            BANK.end_piece()
+
+        with PROFILER.span("draw"):
+            if roll:
+                roll.draw(WIN, pygame.time.get_ticks() - initial_time)
+            # Draw all white notes first (otherwise half of the black notes would be covered)
+            for note_object in NOTES:
+                if len(note_object.key_type) == 1:
+                    note_object.draw_note()
+            # Draw all the black notes over the white notes
+            for note_object in NOTES:
+                if len(note_object.key_type) == 2:
+                    note_object.draw_note()
 
         # Check for events
-        for event in pygame.event.get():
-            if event.type == pygame.KEYUP:
-                # If user presses escape
-                if event.key == pygame.K_ESCAPE:
-                    run = False
-            elif event.type == pygame.MOUSEBUTTONUP:
-                # If mouse is on close button
-                if closed:
-                    run = False
+        with PROFILER.span("events"):
+            for event in events:
+                if event.type == pygame.KEYUP:
+                    # If user presses escape
+                    if event.key == pygame.K_ESCAPE:
+                        run = False
+                    # Show or hide the profiling statistics
+                    elif event.key == pygame.K_F3:
+                        PROFILER.overlay = not PROFILER.overlay
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    # If mouse is on close button
+                    if closed:
+                        run = False
 
         # Change button color if mouse hovers over it
         if mouse_x >= MON_W - CLOSE[0] and mouse_y <= CLOSE[1]:
@@ -367,13 +649,35 @@ def main():
             close_button(GRAY)
             closed = False
 
+        # Draw the profiling statistics on top of everything
+        PROFILER.draw(WIN)
         # Update display
-        pygame.display.flip()
+        with PROFILER.span("flip"):
+            pygame.display.flip()
+        PROFILER.end_frame()
+
+        # Run again for the next note or fade, and at the frame rate while something moves on the screen
+        deadline = scheduler.next_deadline(initial_time)
+        if PROFILER.overlay or roll and not scheduler.done() or \
+                any(note_object.color != note_object.initial_color for note_object in NOTES):
+            deadline = min(deadline or math.inf, pacer.frame_deadline())
 
 
 if __name__ == "__main__":
+    # Start mixing the notes in the background
+    if MIXER:
+        MIXER.start()
     try:
         main()
     except Exception as error:
         print(error)
+    if MIXER:
+        MIXER.close()
+        # Report the time spent mixing each block compared to the duration of a block
+        print("Mixer: " + ", ".join("{0} {1}".format(name, value) for name, value in MIXER.stats().items()))
+    # Save the profiling statistics
+    if PROFILE:
+        PROFILER.dump(PROFILE_DUMP)
+    if TIMING:
+        TIMING_LOG.dump(TIMING_DUMP)
     pygame.quit()
@@ -0,0 +1,68 @@
+import os
+import sys
+import timeit
+
+import numpy as np
+
+# The OpenCV scripts are not a package, add their folder to the import path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "OpenCV"))
+import geometry
+
+# Number of quadrilaterals transformed at once (e.g.: pages of a batch of scans)
+BATCH_SIZES = [1, 4, 64, 1024]
+# Number of repetitions for each measurement
+REPEAT = 200
+
+
+# Previous implementation of OpenCV.reorder (one quadrilateral at a time, integer output)
+def legacy_reorder(points):
+    points = points.reshape((4, 2))
+    reordered = np.zeros((4, 1, 2), np.int32)
+    points_sum = points.sum(1)
+    points_difference = np.diff(points, axis=1)
+    reordered[0] = points[np.argmin(points_sum)]
+    reordered[3] = points[np.argmax(points_sum)]
+    reordered[1] = points[np.argmin(points_difference)]
+    reordered[2] = points[np.argmax(points_difference)]
+    return reordered
+
+
+# Previous implementation of OpenCV.rescale (one quadrilateral at a time, in place, integer division)
+def legacy_rescale(points, width, height, final_width, final_height):
+    points = points.reshape((4, 2))
+    for point_num in range(4):
+        points[point_num] = [int(points[point_num][0]) * final_width // width, int(points[point_num][1]) * final_height // height]
+    points = points.reshape((4, 1, 2))
+    return points
+
+
+def random_quads(count, seed=0):
+    # Quadrilaterals roughly shaped like a sheet of paper in a 400 x 300 image
+    random = np.random.default_rng(seed)
+    base = np.array([[50, 40], [350, 30], [40, 270], [360, 280]], np.int32)
+    return (base + random.integers(-30, 30, (count, 4, 2))).reshape((count, 4, 1, 2)).astype(np.int32)
+
+
+def measure(function):
+    # Best of a few runs, in microseconds per call
+    return min(timeit.repeat(function, number=REPEAT, repeat=5)) / REPEAT * 1e6
+
+
+def main():
+    print("{0:>6} {1:>16} {2:>16} {3:>16} {4:>16}".format("quads", "legacy reorder", "batched reorder",
+                                                         "legacy rescale", "batched rescale"))
+    for count in BATCH_SIZES:
+        quads = random_quads(count)
+        # Check that both implementations agree before timing them
+        expected = np.array([legacy_reorder(quad) for quad in quads]).reshape((count, 4, 2))
+        assert (geometry.reorder(quads) == expected).all()
+        legacy_reorder_time = measure(lambda: [legacy_reorder(quad) for quad in quads])
+        batched_reorder_time = measure(lambda: geometry.reorder(quads))
+        legacy_rescale_time = measure(lambda: [legacy_rescale(quad.copy(), 400, 300, 4032, 3024) for quad in quads])
+        batched_rescale_time = measure(lambda: geometry.rescale(quads, 400, 300, 4032, 3024))
+        print("{0:>6} {1:>14.1f}us {2:>14.1f}us {3:>14.1f}us {4:>14.1f}us".format(
+            count, legacy_reorder_time, batched_reorder_time, legacy_rescale_time, batched_rescale_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+import time
+
+# Run without a display or an audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# PianoPlayer.py loads its samples from relative paths
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+import PianoPlayer
+import timing_log
+from profiler import Profiler
+
+# Pacing modes compared, with and without the piano roll (which needs every frame while the piece plays)
+CASES = [("fixed", False), ("events", False), ("fixed", True), ("events", True)]
+# Milliseconds the program keeps running after the piece is over (nothing to do but wait for input)
+IDLE = 5000
+
+
+# Put every note back in its initial state so that the piece plays again from the start
+def reset():
+    for track in PianoPlayer.TRACKS:
+        for note_obj in track.notes():
+            for note in note_obj.key if type(note_obj.key) == list else [note_obj]:
+                note.played = False
+                note.faded = False
+    for note_object in PianoPlayer.NOTES:
+        note_object.color = note_object.initial_color
+
+
+def piece_duration():
+    return max((note_obj.beat_num + PianoPlayer.min_val / note_obj.value) * PianoPlayer.DURATION + PianoPlayer.DELAY
+               for track in PianoPlayer.TRACKS for note_obj in track.notes())
+
+
+def run(pacing, piano_roll, music):
+    reset()
+    PianoPlayer.PACING = pacing
+    PianoPlayer.PIANO_ROLL = piano_roll
+    PianoPlayer.PROFILER = Profiler()
+    PianoPlayer.TIMING_LOG = timing_log.TimingLog()
+    # Quit the main loop the same way the user does
+    pygame.time.set_timer(pygame.event.Event(pygame.KEYUP, key=pygame.K_ESCAPE), round(music + IDLE), loops=1)
+    # CPU time (of every thread, including the audio) when the music ends
+    music_end = []
+    timer = threading.Timer(music / 1000, lambda: music_end.append((time.perf_counter(), time.process_time())))
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    timer.start()
+    PianoPlayer.main()
+    end = (time.perf_counter(), time.process_time())
+    events = PianoPlayer.TIMING_LOG.ordered()
+    onsets = events[events["kind"] == timing_log.NOTE_ON]
+    lateness = onsets["actual"] - onsets["scheduled"]
+    (music_wall, music_cpu), = music_end
+    return {"cpu": (music_cpu - cpu) / (music_wall - wall), "idle_cpu": (end[1] - music_cpu) / (end[0] - music_wall),
+            "frames": PianoPlayer.PROFILER.frame_count, "onsets": len(onsets),
+            "p50": np.percentile(lateness, 50), "p95": np.percentile(lateness, 95), "max": lateness.max()}
+
+
+def main():
+    music = piece_duration()
+    print("{0:.1f}s of music, then {1:.1f}s idle".format(music / 1000, IDLE / 1000))
+    print("{0:>8} {1:>6} {2:>10} {3:>9} {4:>7} {5:>7} {6:>11} {7:>11} {8:>11}".format(
+        "pacing", "roll", "CPU music", "CPU idle", "frames", "onsets", "late p50", "late p95", "late max"))
+    for pacing, piano_roll in CASES:
+        result = run(pacing, piano_roll, music)
+        print("{0:>8} {1:>6} {2:>9.1%} {3:>8.1%} {4:>7} {5:>7} {6:>9.1f}ms {7:>9.1f}ms {8:>9.1f}ms".format(
+            pacing, "on" if piano_roll else "off", result["cpu"], result["idle_cpu"], result["frames"],
+            result["onsets"], result["p50"], result["p95"], result["max"]))
+
+
+if __name__ == "__main__":
+    main()
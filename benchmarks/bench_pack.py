@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from mixer import from_float, to_float
+from samples import SampleBank, pack_folder
+from score import Score
+
+# Folder of the trimmed samples
+DATA = os.path.join(ROOT, "data")
+# Piece whose notes are loaded at startup
+SCORE = os.path.join(ROOT, "scores", "fur_elise.json")
+# Number of times the startup is measured (the fastest run is kept)
+REPEAT = 3
+
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder) if name.endswith(".wav"))
+
+
+# Milliseconds until the program can start playing (the wav files are all read before, the pack is decoded after)
+# The notes are converted like the software mixer plays them, a note is only ready to play once it is converted
+def startup(path, keys):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        bank = SampleBank(path, convert=to_float, revert=from_float)
+        if bank.pack is None:
+            bank.load(keys)
+            ready = time.perf_counter()
+            first = all_loaded = ready
+        else:
+            thread = bank.decode_ahead(keys)
+            ready = time.perf_counter()
+            # When the first note of the piece is decoded, and when the whole piece is
+            while not bank.ready(keys[0]):
+                time.sleep(0.0005)
+            first = time.perf_counter()
+            thread.join()
+            all_loaded = time.perf_counter()
+        result = [(moment - start) * 1000 for moment in (ready, first, all_loaded)]
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+def main():
+    keys = Score.load(SCORE).keys()
+    with tempfile.TemporaryDirectory() as folder:
+        pack = os.path.join(folder, "data.zip")
+        start = time.perf_counter()
+        pack_folder(DATA, pack)
+        pack_time = time.perf_counter() - start
+
+        wav_bytes = folder_size(DATA)
+        pack_bytes = os.path.getsize(pack)
+        print("data folder {0:.1f}MB, pack {1:.1f}MB ({2:.0%} smaller, packed in {3:.1f}s)".format(
+            wav_bytes / 2 ** 20, pack_bytes / 2 ** 20, 1 - pack_bytes / wav_bytes, pack_time))
+
+        # Decoding cost of every note, and check that the pack is lossless
+        wav_bank = SampleBank(DATA)
+        pack_bank = SampleBank(pack)
+        decode_times = []
+        for number in sorted(pack_bank.available):
+            start = time.perf_counter()
+            samples = pack_bank.loader(pack_bank.available[number])
+            decode_times.append((time.perf_counter() - start) * 1000)
+            if not np.array_equal(samples, wav_bank.loader(wav_bank.available[number])):
+                print("Not lossless: " + pack_bank.available[number])
+        print("decode p50 {0:.1f}ms  max {1:.1f}ms per note".format(np.median(decode_times), max(decode_times)))
+
+        print()
+        print("startup with the {0} notes of {1}".format(len(keys), os.path.basename(SCORE)))
+        print("{0:>6} {1:>10} {2:>12} {3:>12}".format("source", "ready", "first note", "all notes"))
+        for name, path in (("wav", DATA), ("pack", pack)):
+            ready, first, all_loaded = startup(path, keys)
+            print("{0:>6} {1:>8.1f}ms {2:>10.1f}ms {3:>10.1f}ms".format(name, ready, first, all_loaded))
+
+
+if __name__ == "__main__":
+    main()
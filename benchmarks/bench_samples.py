@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import samples
+from samples import SampleBank, key_name, pitch_shift
+from score import Score
+
+# Folder of the trimmed samples
+DATA = os.path.join(ROOT, "data")
+# Resident steps compared (1 keeps every note)
+STEPS = [1, 2, 3, 4]
+# Largest denominators of the resampling ratio compared (quality against speed)
+DENOMINATORS = [20, 160, 1000]
+# Number of samples used to estimate the pitch of a note
+PITCH_WINDOW = 16384
+# Piece whose notes are played to measure the memory the bank holds while playing (resident and derived notes)
+SCORE = os.path.join(ROOT, "scores", "fur_elise.json")
+
+
+# Frequency of the strongest partial of a note (with parabolic interpolation between the bins of the spectrum)
+def dominant_frequency(data):
+    window = data[:PITCH_WINDOW, 0].astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(window * np.hanning(len(window))))
+    peak = int(np.argmax(spectrum[1:-1])) + 1
+    left, center, right = np.log(spectrum[peak - 1:peak + 2] + 1e-12)
+    offset = 0.5 * (left - right) / (left - 2 * center + right)
+    return (peak + offset) * 44100 / len(window)
+
+
+# Compare the derived notes to the real samples of the same notes
+def measure(step, max_denominator=samples.MAX_DENOMINATOR):
+    bank = SampleBank(DATA, step=step)
+    bank.load()
+    latencies = []
+    errors = []
+    for number in sorted(bank.available):
+        if number in bank.resident:
+            continue
+        start = time.perf_counter()
+        derived = pitch_shift(bank.resident[bank.source(number)], number - bank.source(number), max_denominator)
+        latencies.append((time.perf_counter() - start) * 1000)
+        real = bank.loader(bank.available[number])
+        if len(derived) >= PITCH_WINDOW and len(real) >= PITCH_WINDOW:
+            errors.append(abs(1200 * np.log2(dominant_frequency(derived) / dominant_frequency(real))))
+    return bank, latencies, errors
+
+
+# Bytes held by the bank once every one of these notes was played (the resident notes they need and the derived notes)
+def memory(step, keys):
+    bank = SampleBank(DATA, step=step)
+    bank.load(keys)
+    for key in keys:
+        bank.get(key)
+    return bank.memory_bytes()
+
+
+# Resample up and back down by a semitone and compare to the original (only the resampling filter loses anything)
+def round_trip_snr(data, max_denominator):
+    back = pitch_shift(pitch_shift(data, 1, max_denominator), -1, max_denominator)[:len(data)].astype(np.float64)
+    original = data[:len(back)].astype(np.float64)
+    noise = np.sum((original - back) ** 2)
+    return 10 * np.log10(np.sum(original ** 2) / noise) if noise else float("inf")
+
+
+def main():
+    full = None
+    keys = Score.load(SCORE).keys()
+    # Memory after playing every note of the keyboard, then every note of the piece (resident and derived notes)
+    print("{0:>5} {1:>9} {2:>10} {3:>13} {4:>13} {5:>13} {6:>16}".format(
+        "step", "keyboard", "reduction", os.path.splitext(os.path.basename(SCORE))[0], "derive p50", "derive max",
+        "pitch error p50"))
+    for step in STEPS:
+        bank, latencies, errors = measure(step)
+        keyboard = memory(step, sorted(bank.available))
+        full = full or keyboard
+        print("{0:>5} {1:>7.1f}MB {2:>9.2f}x {3:>11.1f}MB {4:>11.2f}ms {5:>11.2f}ms {6:>11.1f} cents".format(
+            step, keyboard / 2 ** 20, full / keyboard, memory(step, keys) / 2 ** 20,
+            np.median(latencies) if latencies else 0, max(latencies) if latencies else 0,
+            np.median(errors) if errors else 0))
+
+    print()
+    reference = SampleBank(DATA).loader(os.path.join(DATA, "A4.wav"))
+    print("{0:>12} {1:>13} {2:>16} {3:>16}".format("denominator", "derive p50", "pitch error p50", "round trip SNR"))
+    for max_denominator in DENOMINATORS:
+        _, latencies, errors = measure(3, max_denominator)
+        print("{0:>12} {1:>11.2f}ms {2:>11.1f} cents {3:>13.1f} dB".format(
+            max_denominator, np.median(latencies), np.median(errors), round_trip_snr(reference, max_denominator)))
+    print("Missing notes are derived too, e.g.: Db8 from " + key_name(SampleBank(DATA, step=3).source(109)))
+
+
+if __name__ == "__main__":
+    main()
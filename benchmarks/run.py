@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Run without a display, an audio device or a camera
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+# PianoPlayer.py loads its samples from relative paths
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "OpenCV"))
+
+import PianoPlayer
+import trimmer
+from mixer import NullSink, SoftwareMixer
+from pages import find_pages
+from preprocessing import Preprocessor
+from synthetic import score_duration, synthetic_sample_folder, synthetic_score, synthetic_sheet
+
+# Baseline results that the current results are compared to
+BASELINE = os.path.join(BENCHMARKS, "baseline.json")
+# A case is a regression if its median frame time grows by more than this fraction
+TOLERANCE = 0.25
+# Name of the case that measures the speed of the machine
+CALIBRATION = "calibration"
+# Number of times each case runs (the fastest run is kept)
+REPEAT = 3
+# Number of notes in the synthetic scores
+SCORE_LENGTHS = [100, 1000, 5000]
+# Number of tracks of the synthetic scores with the most notes
+TRACK_COUNTS = [2, 8]
+# Number of scheduling passes measured over the length of each score
+SCHEDULE_FRAMES = 120
+# Number of frames drawn for the keyboard
+RENDER_FRAMES = 300
+# Number of frames of the piano roll drawn over the length of each score
+ROLL_FRAMES = 300
+# Length in seconds of the synthetic samples that are trimmed
+TRIM_DURATIONS = [1, 4]
+# Number of times each synthetic sample is trimmed
+TRIM_REPEAT = 3
+# Block sizes and number of voices played at once by the software mixer
+MIXER_CASES = [(256, 32), (512, 32), (1024, 32), (512, 128)]
+# Number of blocks mixed for each case
+MIXER_BLOCKS = 400
+# Resolutions of the synthetic photographed sheets (width, height, number of pages)
+SHEETS = [(640, 480, 1), (1920, 1080, 2), (4032, 3024, 1)]
+# Number of frames analyzed for each sheet
+DETECTION_FRAMES = 10
+
+
+# Peak memory allocated by Python and numpy while running a benchmark case
+# Tracing is started once and never stopped, stopping it while the pygame mixer is running can crash the interpreter
+def peak_memory(function):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    return round((peak - current) / 2 ** 20, 3)
+
+
+# Run a benchmark case a few times and keep the fastest run (the slower ones are mostly noise from the machine)
+def best_of(function, repeat):
+    return min((function() for _ in range(repeat)), key=lambda result: result["p50_ms"])
+
+
+def frame_stats(frame_times, units, unit_name):
+    frame_times = np.asarray(frame_times)
+    return {"p50_ms": round(float(np.percentile(frame_times, 50)), 4),
+            "p95_ms": round(float(np.percentile(frame_times, 95)), 4),
+            "throughput": round(units / (frame_times.sum() / 1000), 1),
+            "unit": unit_name}
+
+
+# Fixed workload (Python loop and numpy sort) used to tell how fast the machine currently is
+# The results are compared to the baseline relative to this workload, so a busy or slower machine doesn't look like a regression
+def calibration():
+    values = np.random.default_rng(0).random(200000)
+
+    def run():
+        frame_times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            total = 0
+            for i in range(50000):
+                total += i % 7
+            np.sort(values)
+            frame_times.append((time.perf_counter() - start) * 1000)
+        return frame_stats(frame_times, 5, "runs/s")
+    return run
+
+
+def bench_scheduling(length, tracks=2):
+    def run():
+        score = synthetic_score(PianoPlayer, length, tracks=tracks)
+        scheduler = PianoPlayer.Scheduler(score)
+        duration = score_duration(PianoPlayer, score)
+        frame_times = []
+        # Go through the score in order, like the main loop does
+        for elapsed in np.linspace(0, duration, SCHEDULE_FRAMES):
+            # The scheduler measures the time since start_time, move the start back so that the elapsed time is simulated
+            start_time = pygame.time.get_ticks() - elapsed
+            start = time.perf_counter()
+            scheduler.play(start_time)
+            frame_times.append((time.perf_counter() - start) * 1000)
+        return frame_stats(frame_times, length, "notes/s")
+    return run
+
+
+def bench_rendering():
+    def run():
+        random = np.random.default_rng(0)
+        frame_times = []
+        for _ in range(RENDER_FRAMES):
+            # Start a few fades, like notes being played
+            for index in random.integers(len(PianoPlayer.NOTES), size=3):
+                note_object = PianoPlayer.NOTES[index]
+                note_object.color = PianoPlayer.LIGHT_BLUE if len(note_object.key_type) == 1 else PianoPlayer.DARK_BLUE
+            start = time.perf_counter()
+            PianoPlayer.WIN.fill(PianoPlayer.BLACK)
+            for note_object in PianoPlayer.NOTES:
+                if len(note_object.key_type) == 1:
+                    note_object.draw_note()
+            for note_object in PianoPlayer.NOTES:
+                if len(note_object.key_type) == 2:
+                    note_object.draw_note()
+            frame_times.append((time.perf_counter() - start) * 1000)
+        return frame_stats(frame_times, RENDER_FRAMES, "frames/s")
+    return run
+
+
+def bench_piano_roll(length):
+    def run():
+        score = synthetic_score(PianoPlayer, length)
+        roll = PianoPlayer.PianoRoll(score, 0, 3 * PianoPlayer.MON_H // 4)
+        frame_times = []
+        for elapsed in np.linspace(0, score_duration(PianoPlayer, score), ROLL_FRAMES):
+            start = time.perf_counter()
+            roll.draw(PianoPlayer.WIN, elapsed)
+            frame_times.append((time.perf_counter() - start) * 1000)
+        return frame_stats(frame_times, ROLL_FRAMES, "frames/s")
+    return run
+
+
+def bench_mixing(block_size, voices):
+    random = np.random.default_rng(0)
+    # Long enough samples so that the voices keep playing for every block
+    samples = [random.uniform(-0.1, 0.1, (block_size * MIXER_BLOCKS, 2)).astype(np.float32) for _ in range(voices)]
+
+    def run():
+        mixer = SoftwareMixer(NullSink(), block_size=block_size)
+        for channel, sample in enumerate(samples):
+            mixer.Channel(channel).play(sample)
+        mixer.render(MIXER_BLOCKS)
+        result = frame_stats(list(mixer.render_times), MIXER_BLOCKS, "blocks/s")
+        # Fraction of the duration of a block spent mixing it
+        result["load"] = mixer.stats()["load"]
+        return result
+    return run
+
+
+def bench_trimming(folder, seconds):
+    name, = synthetic_sample_folder(folder, [seconds])
+
+    def run():
+        frame_times = []
+        for _ in range(TRIM_REPEAT):
+            start = time.perf_counter()
+            trimmer.trim_note(name, source=folder, destination=folder)
+            frame_times.append((time.perf_counter() - start) * 1000)
+        return frame_stats(frame_times, TRIM_REPEAT * seconds * 44100, "samples/s")
+    return run
+
+
+def bench_detection(width, height, pages):
+    image = synthetic_sheet(width, height, pages)
+    processed_width = 400
+    processed_height = round(height * processed_width / width)
+
+    def run():
+        preprocessor = Preprocessor(processed_width, processed_height)
+        frame_times = []
+        found = 0
+        for _ in range(DETECTION_FRAMES):
+            start = time.perf_counter()
+            processed, not_black = preprocessor.run(image)
+            if not_black:
+                found = len(find_pages(processed, processed_width * processed_height))
+            frame_times.append((time.perf_counter() - start) * 1000)
+        result = frame_stats(frame_times, DETECTION_FRAMES, "frames/s")
+        result["pages_found"] = found
+        return result
+    return run
+
+
+def run_all(quick=False):
+    # Every note of the synthetic scores plays a short synthetic sound
+    # (the samples loaded by PianoPlayer.py are kept, pygame crashes if a sound is freed while the mixer uses it)
+    sound = pygame.sndarray.make_sound(np.zeros((441, 2), np.int16))
+    loaded = [getattr(PianoPlayer, note_object.key, None) for note_object in PianoPlayer.NOTES]
+    for note_object in PianoPlayer.NOTES:
+        setattr(PianoPlayer, note_object.key, sound)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Every case returns a function that runs it from scratch
+        cases = {CALIBRATION: calibration()}
+        for length in SCORE_LENGTHS[:2] if quick else SCORE_LENGTHS:
+            cases["scheduling/{0}".format(length)] = bench_scheduling(length)
+        for tracks in TRACK_COUNTS[1:]:
+            length = SCORE_LENGTHS[-1]
+            cases["scheduling/{0}x{1}".format(length, tracks)] = bench_scheduling(length, tracks)
+        cases["rendering/88"] = bench_rendering()
+        for length in SCORE_LENGTHS[:2] if quick else SCORE_LENGTHS:
+            cases["piano_roll/{0}".format(length)] = bench_piano_roll(length)
+        for block_size, voices in MIXER_CASES[:2] if quick else MIXER_CASES:
+            cases["mixing/{0}x{1}".format(block_size, voices)] = bench_mixing(block_size, voices)
+        for seconds in TRIM_DURATIONS[:1] if quick else TRIM_DURATIONS:
+            cases["trimming/{0}s".format(seconds)] = bench_trimming(folder, seconds)
+        for width, height, pages in SHEETS[:2] if quick else SHEETS:
+            cases["detection/{0}x{1}x{2}".format(width, height, pages)] = bench_detection(width, height, pages)
+
+        # Time every case first, then run them again to measure the memory (tracing the allocations slows everything down)
+        results = {name: best_of(run, REPEAT) for name, run in cases.items()}
+        for name, run in cases.items():
+            results[name]["peak_mb"] = peak_memory(run)
+    return results
+
+
+# Compare the results to the baseline, returns the names of the cases that got slower
+def compare(results, baseline, tolerance):
+    regressions = []
+    # How much slower the machine currently is compared to when the baseline was saved
+    speed = 1
+    if CALIBRATION in baseline and baseline[CALIBRATION]["p50_ms"]:
+        speed = results[CALIBRATION]["p50_ms"] / baseline[CALIBRATION]["p50_ms"]
+    print("{0:<28} {1:>10} {2:>10} {3:>8} {4:>16} {5:>9}".format("case", "p50 ms", "p95 ms", "vs base", "throughput",
+                                                                  "peak MB"))
+    for name, result in results.items():
+        reference = baseline.get(name)
+        change = ""
+        if reference and reference["p50_ms"] and name != CALIBRATION:
+            ratio = result["p50_ms"] / reference["p50_ms"] / speed
+            change = "{0:+.0%}".format(ratio - 1)
+            if ratio > 1 + tolerance:
+                regressions.append(name)
+                change += " !"
+        print("{0:<28} {1:>10.3f} {2:>10.3f} {3:>8} {4:>10.0f} {5:<5} {6:>9.2f}".format(
+            name, result["p50_ms"], result["p95_ms"], change, result["throughput"], result["unit"], result["peak_mb"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scheduling, rendering, mixing, trimming and sheet detection")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--quick", action="store_true", help="skip the biggest cases")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed growth of the median frame time before a case counts as a regression")
+    arguments = parser.parse_args()
+
+    results = run_all(quick=arguments.quick)
+    baseline = {}
+    if os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, arguments.tolerance)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if arguments.save:
+        with open(arguments.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print("Saved baseline: " + arguments.baseline)
+    elif regressions:
+        print("Slower than the baseline: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
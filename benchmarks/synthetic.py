@@ -0,0 +1,95 @@
+import os
+
+import cv2
+import numpy as np
+from scipy.io import wavfile
+
+# Sample rate of the synthetic samples (same as the real samples)
+SAMPLE_RATE = 44100
+
+
+# Build a score of random notes with the N and Track classes of PianoPlayer.py (two tracks, like the two hands)
+# Returns the list of tracks (same layout as TRACKS)
+def synthetic_score(player, length, seed=0, bar_length=6, tracks=2):
+    random = np.random.default_rng(seed)
+    keys = [note.key for note in player.NOTES]
+    values = [4, 8, 16, 16, 16]
+    score = []
+    for track in range(tracks):
+        bars = []
+        beat = 0
+        for start in range(0, length // tracks, bar_length):
+            bar = []
+            for _ in range(min(bar_length, length // tracks - start)):
+                # Some of the notes are silences
+                key = "s" if random.random() < 0.1 else keys[random.integers(len(keys))]
+                note = player.N(key, values[random.integers(len(values))], pedal=bool(random.random() < 0.5))
+                note.track = track
+                note.beat_num = beat
+                beat += round(16 / note.value)
+                bar.append(note)
+            bars.append(bar)
+        score.append(player.Track(bars))
+    # Every note of the synthetic score is expressed in sixteenth notes
+    player.min_val = 16
+    player.DURATION = round(player.TIME_SIGNATURE_BOTTOM / player.min_val * player.BEAT_DURATION)
+    # Every track needs its channels
+    player.create_channels(player.CHANNELS_PER_TRACK * tracks)
+    return score
+
+
+# Length in milliseconds of a synthetic score
+def score_duration(player, tracks):
+    last_beat = max(note.beat_num for track in tracks for note in track.notes())
+    return (last_beat + 1) * player.DURATION + player.DELAY
+
+
+# Decaying piano-like tone surrounded by silence, written like the original samples (stereo 16 bit)
+def synthetic_wav(path, seconds, frequency=440, seed=0):
+    random = np.random.default_rng(seed)
+    time = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = np.sin(2 * np.pi * frequency * time) * np.exp(-3 * time / seconds) * 20000
+    # Low noise floor under the threshold of the trimmer
+    tone += random.normal(0, 50, tone.shape)
+    silence = np.zeros(SAMPLE_RATE // 2)
+    samples = np.concatenate([silence, tone, silence]).astype(np.int16)
+    wavfile.write(path, SAMPLE_RATE, np.stack([samples, samples], axis=1))
+    return path
+
+
+# Photo of a sheet of music lying on a table (perspective, lighting gradient and sensor noise)
+def synthetic_sheet(width, height, pages=1, seed=0):
+    random = np.random.default_rng(seed)
+    # Dark table with a lighting gradient
+    gradient = np.linspace(40, 90, width, dtype=np.float32)
+    image = np.repeat(np.tile(gradient, (height, 1))[:, :, np.newaxis], 3, axis=2)
+    page_width = width / pages
+    for page in range(pages):
+        # Slightly tilted page
+        left = page * page_width
+        jitter = random.uniform(-0.03, 0.03, (4, 2)) * (page_width, height)
+        corners = np.array([[left + 0.1 * page_width, 0.08 * height], [left + 0.9 * page_width, 0.1 * height],
+                            [left + 0.92 * page_width, 0.92 * height], [left + 0.08 * page_width, 0.9 * height]]) + jitter
+        sheet = np.full((1100, 850, 3), 235, np.float32)
+        # Staves of five lines
+        for staff in range(10):
+            for line in range(5):
+                y = 100 + staff * 95 + line * 10
+                sheet[y:y + 2, 60:790] = 30
+        source = np.float32([[0, 0], [850, 0], [850, 1100], [0, 1100]])
+        matrix = cv2.getPerspectiveTransform(source, np.float32(corners))
+        mask = cv2.warpPerspective(np.ones((1100, 850), np.float32), matrix, (width, height))[:, :, np.newaxis]
+        warped = cv2.warpPerspective(sheet, matrix, (width, height))
+        image = image * (1 - mask) + warped * mask
+    image += random.normal(0, 4, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+# Folder with synthetic samples named like the original samples (e.g.: "Piano.ff.A4.wav")
+def synthetic_sample_folder(folder, durations):
+    names = []
+    for i, seconds in enumerate(durations):
+        name = "S{0}".format(i)
+        synthetic_wav(os.path.join(folder, "Piano.ff.{0}.wav".format(name)), seconds, seed=i)
+        names.append(name)
+    return names
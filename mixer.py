@@ -0,0 +1,253 @@
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+import pygame
+from scipy.io import wavfile
+
+# Sample rate of the samples and of the output stream
+SAMPLE_RATE = 44100
+# Number of samples rendered at once (smaller blocks mean less latency but more work per second)
+BLOCK_SIZE = 512
+# Milliseconds for a note to reach full volume (a few milliseconds are enough to avoid a click)
+ATTACK = 3
+# Milliseconds for a note to go silent when it is stopped or when another note replaces it on the same channel
+STOP_RELEASE = 15
+# Number of blocks kept for the render time statistics
+STATS_WINDOW = 1000
+
+
+# Load a wav file as float samples between -1 and 1, shape (number of samples, 2)
+def load_sample(path):
+    _, data = wavfile.read(path)
+    return to_float(data)
+
+
+# Convert 16 bit samples into the float samples mixed by the software mixer
+def to_float(data):
+    samples = data.astype(np.float32) / 32768
+    if samples.ndim == 1:
+        samples = np.stack([samples, samples], axis=1)
+    return samples
+
+
+# Float samples back at the 16 bit scale (e.g.: to derive other notes from them)
+def from_float(samples):
+    return samples * 32768
+
+
+# One sample being played
+class Voice:
+    __slots__ = ("samples", "position", "release", "release_position")
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.position = 0
+        # Release envelope (None while the note is held) and how far into it the voice is
+        self.release = None
+        self.release_position = 0
+
+
+# Same interface as pygame.mixer.Channel (play, stop and fadeout) so that the notes don't care which mixer is used
+class MixerChannel:
+    def __init__(self, mixer, number):
+        self.mixer = mixer
+        self.number = number
+
+    def play(self, samples):
+        self.mixer.play(self.number, samples)
+
+    def stop(self):
+        self.mixer.fadeout(self.number, STOP_RELEASE)
+
+    def fadeout(self, milliseconds):
+        self.mixer.fadeout(self.number, milliseconds)
+
+
+# Mixes any number of voices in fixed size blocks and sends the blocks to a single output (sink)
+# Every note starts with an attack envelope and ends with a release envelope, so notes never start or stop with a click
+class SoftwareMixer:
+    def __init__(self, sink, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, attack=ATTACK):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        # Envelope tables are computed once, the release tables once per length
+        self.attack = np.linspace(0, 1, max(1, attack * sample_rate // 1000), endpoint=False, dtype=np.float32)
+        self.releases = {}
+        # Voices being played and the voice of each channel
+        self.voices = []
+        self.channels = {}
+        # Notes are started from the main thread while the blocks are rendered in the mixer thread
+        self.lock = threading.Lock()
+        # Buffers reused for every block
+        self.mix = np.zeros((block_size, 2), np.float32)
+        self.scratch = np.zeros((block_size, 2), np.float32)
+        self.output = np.zeros((block_size, 2), np.int16)
+        # Render time of the latest blocks in milliseconds
+        self.render_times = deque(maxlen=STATS_WINDOW)
+        self.thread = None
+        self.running = False
+
+    def Channel(self, number):
+        return MixerChannel(self, number)
+
+    def release_table(self, milliseconds):
+        length = max(1, int(milliseconds * self.sample_rate // 1000))
+        table = self.releases.get(length)
+        if table is None:
+            table = self.releases[length] = np.linspace(1, 0, length, dtype=np.float32)
+        return table
+
+    def play(self, channel, samples):
+        voice = Voice(samples)
+        with self.lock:
+            # Fade out the note that was playing on this channel instead of cutting it
+            previous = self.channels.get(channel)
+            if previous is not None and previous.release is None:
+                previous.release = self.release_table(STOP_RELEASE)
+            self.channels[channel] = voice
+            self.voices.append(voice)
+
+    def fadeout(self, channel, milliseconds):
+        with self.lock:
+            voice = self.channels.get(channel)
+            if voice is not None and voice.release is None:
+                voice.release = self.release_table(milliseconds)
+
+    def fadeout_all(self, milliseconds):
+        with self.lock:
+            for voice in self.voices:
+                if voice.release is None:
+                    voice.release = self.release_table(milliseconds)
+
+    def render_block(self):
+        start = time.perf_counter()
+        mix = self.mix
+        scratch = self.scratch
+        mix.fill(0)
+        with self.lock:
+            finished = False
+            for voice in self.voices:
+                position = voice.position
+                segment = voice.samples[position:position + self.block_size]
+                length = len(segment)
+                if voice.release is not None:
+                    # The note ends when the release envelope is over
+                    envelope = voice.release[voice.release_position:voice.release_position + length]
+                    length = len(envelope)
+                    voice.release_position += length
+                    np.multiply(segment[:length], envelope[:, np.newaxis], out=scratch[:length])
+                    if voice.release_position >= len(voice.release):
+                        voice.position = len(voice.samples)
+                else:
+                    np.copyto(scratch[:length], segment)
+                if position < len(self.attack):
+                    # The note is still fading in (even when it is already released, otherwise it would start with a click)
+                    attack = self.attack[position:position + length]
+                    scratch[:len(attack)] *= attack[:, np.newaxis]
+                mix[:length] += scratch[:length]
+                voice.position += length
+                if voice.position >= len(voice.samples):
+                    finished = True
+            # Forget the voices that are over
+            if finished:
+                self.voices = [voice for voice in self.voices if voice.position < len(voice.samples)]
+                for channel, voice in list(self.channels.items()):
+                    if voice.position >= len(voice.samples):
+                        del self.channels[channel]
+        # Convert to 16 bit without overflowing
+        np.clip(mix, -1, 32767 / 32768, out=mix)
+        np.multiply(mix, 32768, out=self.output, casting="unsafe")
+        self.render_times.append((time.perf_counter() - start) * 1000)
+        return self.output
+
+    # Render and output a number of blocks right away (used for testing and for rendering to a file)
+    def render(self, blocks):
+        for _ in range(blocks):
+            self.sink.write(self.render_block())
+
+    def run(self):
+        block_duration = self.block_size / self.sample_rate
+        next_block = time.perf_counter()
+        while self.running:
+            self.sink.write(self.render_block())
+            # Sinks that don't wait for the audio device are paced to real time
+            if not self.sink.blocking:
+                next_block += block_duration
+                delay = next_block - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.sink.close()
+
+    def stats(self):
+        # Per block CPU cost compared to the duration of a block (a load close to 1 means the mixer can't keep up)
+        block_ms = self.block_size / self.sample_rate * 1000
+        times = np.array(self.render_times) if self.render_times else np.zeros(1)
+        return {"block_size": self.block_size, "block_ms": round(block_ms, 3),
+                "mean_ms": round(float(times.mean()), 4), "p99_ms": round(float(np.percentile(times, 99)), 4),
+                "max_ms": round(float(times.max()), 4), "load": round(float(times.mean()) / block_ms, 4)}
+
+
+# Discards the blocks (for testing and benchmarks)
+class NullSink:
+    blocking = False
+
+    def __init__(self):
+        self.blocks = 0
+
+    def write(self, block):
+        self.blocks += 1
+
+    def close(self):
+        pass
+
+
+# Writes the blocks to a wav file
+class WaveFileSink:
+    blocking = False
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(2)
+        self.file.setsampwidth(2)
+        self.file.setframerate(sample_rate)
+
+    def write(self, block):
+        self.file.writeframes(block.tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+# Plays the blocks one after the other on a single pygame channel
+# (pygame.mixer must be initialized with the same sample rate, 16 bit and stereo)
+class PygameSink:
+    blocking = True
+
+    def __init__(self, channel=0):
+        self.channel = pygame.mixer.Channel(channel)
+
+    def write(self, block):
+        sound = pygame.mixer.Sound(buffer=block.tobytes())
+        # Wait until the channel has room for the next block (one block playing and one queued)
+        while self.channel.get_queue() is not None:
+            time.sleep(0.001)
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+
+    def close(self):
+        self.channel.stop()
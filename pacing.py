@@ -0,0 +1,45 @@
+import pygame
+
+# Redraw at a fixed frame rate, like clock.tick(60)
+FIXED = "fixed"
+# Only wake up for the next deadline (e.g.: a note onset or an animation frame) or for an input event
+EVENTS = "events"
+# Frame rate of the fixed mode, and of the event mode while something is moving on the screen
+FPS = 60
+
+
+# Decides when the next frame of a main loop runs and gets the input events for it
+class Pacer:
+    def __init__(self, mode=FIXED, fps=FPS):
+        self.mode = mode
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        # Number of frames that ran and number of frames that only ran because an input event came in
+        self.frames = 0
+        self.woken = 0
+
+    def frame_deadline(self):
+        # Ticks at which the next animation frame is due
+        return pygame.time.get_ticks() + 1000 // self.fps
+
+    def wait(self, deadline=None):
+        # Block until the deadline (in pygame ticks, None waits for input only) and return the input events to handle
+        self.frames += 1
+        if self.mode == FIXED:
+            self.clock.tick(self.fps)
+            return pygame.event.get()
+        events = pygame.event.get()
+        if events:
+            return events
+        if deadline is None:
+            timeout = 0
+        else:
+            timeout = deadline - pygame.time.get_ticks()
+            if timeout <= 0:
+                return events
+        # A timeout of 0 waits until an event comes in
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            return events
+        self.woken += 1
+        return [event] + pygame.event.get()
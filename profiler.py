@@ -0,0 +1,174 @@
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+# Number of frames kept for the rolling statistics
+WINDOW = 600
+# Percentiles reported for the frame times and for each span
+PERCENTILES = (50, 95, 99)
+# An onset that happens later than this many milliseconds after its scheduled time counts as a missed deadline
+DEADLINE_TOLERANCE = 1000 / 60
+# Number of frames between two updates of the overlay text
+OVERLAY_REFRESH = 30
+
+
+# Context manager that does nothing, returned by a disabled profiler so that timing a span costs almost nothing
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# Times one named stage of a frame (e.g.: "draw"), one object is reused for every frame
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.profiler.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+# Keeps track of where the time goes in a main loop: named spans per frame, rolling frame time percentiles
+# and missed deadlines (e.g.: note onsets that played too late)
+class Profiler:
+    def __init__(self, enabled=True, window=WINDOW, deadline_tolerance=DEADLINE_TOLERANCE):
+        self.enabled = enabled
+        self.window = window
+        self.deadline_tolerance = deadline_tolerance
+        # Whether the statistics are drawn on the screen
+        self.overlay = False
+        # Rolling frame times and span times in milliseconds
+        self.frames = deque(maxlen=window)
+        self.spans = {}
+        # Span objects reused from one frame to the next
+        self._span_objects = {}
+        # Time spent in each span during the current frame
+        self._current = {}
+        self._frame_start = None
+        self.frame_count = 0
+        # Number of deadlines checked and missed for each name, and how late the latest ones were
+        self.deadlines = {}
+        self.missed = {}
+        self.lateness = {}
+        # Overlay text lines (only rendered again every few frames)
+        self._overlay_lines = []
+        self._font = None
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        span = self._span_objects.get(name)
+        if span is None:
+            span = self._span_objects[name] = _Span(self, name)
+        return span
+
+    def record(self, name, milliseconds):
+        # Add time to a span of the current frame (also used for stages timed elsewhere, e.g.: preprocessing)
+        if self.enabled:
+            self._current[name] = self._current.get(name, 0) + milliseconds
+
+    def start_frame(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        self.frames.append((time.perf_counter() - self._frame_start) * 1000)
+        # Spans that didn't run during this frame count as 0 so that every history lines up with the frames
+        for name in self.spans.keys() | self._current.keys():
+            history = self.spans.get(name)
+            if history is None:
+                history = self.spans[name] = deque([0.0] * (len(self.frames) - 1), maxlen=self.window)
+            history.append(self._current.get(name, 0.0))
+        self._current.clear()
+        self._frame_start = None
+        self.frame_count += 1
+
+    def deadline(self, name, scheduled, actual):
+        # Compare when something happened to when it should have happened (both in milliseconds)
+        if not self.enabled:
+            return
+        late = actual - scheduled
+        self.deadlines[name] = self.deadlines.get(name, 0) + 1
+        if late > self.deadline_tolerance:
+            self.missed[name] = self.missed.get(name, 0) + 1
+        history = self.lateness.get(name)
+        if history is None:
+            history = self.lateness[name] = deque(maxlen=self.window)
+        history.append(late)
+
+    def summary(self):
+        result = {"frames": self.frame_count, "frame": percentiles(self.frames), "spans": {}, "deadlines": {}}
+        for name, history in self.spans.items():
+            result["spans"][name] = percentiles(history)
+        for name, count in self.deadlines.items():
+            result["deadlines"][name] = {"count": count, "missed": self.missed.get(name, 0),
+                                         "late": percentiles(self.lateness[name])}
+        return result
+
+    def draw(self, surface, position=(10, 10), color=(255, 255, 0)):
+        if not self.enabled or not self.overlay:
+            return
+        if self._font is None:
+            self._font = pygame.font.Font(None, 22)
+        # Only format the statistics again every few frames, sorting the histories for every frame would cost too much
+        if not self._overlay_lines or self.frame_count % OVERLAY_REFRESH == 0:
+            self._overlay_lines = [self._font.render(line, True, color) for line in self.overlay_text()]
+        x, y = position
+        for line in self._overlay_lines:
+            surface.blit(line, (x, y))
+            y += line.get_height()
+
+    def overlay_text(self):
+        summary = self.summary()
+        lines = ["frame  " + format_percentiles(summary["frame"])]
+        for name, values in summary["spans"].items():
+            lines.append("{0}  {1}".format(name, format_percentiles(values)))
+        for name, values in summary["deadlines"].items():
+            lines.append("{0}  missed {1} / {2}".format(name, values["missed"], values["count"]))
+        return lines
+
+    def dump(self, path):
+        # Save the statistics as CSV (one row per frame) or as JSON (summary and rolling frame times)
+        if path.lower().endswith(".csv"):
+            names = sorted(self.spans)
+            with open(path, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(["frame_ms"] + names)
+                for i, frame in enumerate(self.frames):
+                    writer.writerow([round(frame, 3)] + [round(self.spans[name][i], 3) for name in names])
+        else:
+            data = self.summary()
+            data["frame_times"] = [round(frame, 3) for frame in self.frames]
+            with open(path, "w") as file:
+                json.dump(data, file, indent=2)
+
+
+# Percentiles of a list of milliseconds (nearest rank)
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {"p{0}".format(p): 0.0 for p in PERCENTILES}
+    return {"p{0}".format(p): round(ordered[min(len(ordered) - 1, len(ordered) * p // 100)], 3) for p in PERCENTILES}
+
+
+def format_percentiles(values):
+    return "  ".join("{0} {1:.1f}ms".format(name, value) for name, value in values.items())
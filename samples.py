@@ -0,0 +1,283 @@
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from fractions import Fraction
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+# Note names used for the sample files (flats only, like the keyboard of PianoPlayer.py)
+NOTE_NAMES = ["C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"]
+# Position of each natural note in an octave
+NATURALS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+# Note name (e.g.: "Ab4", "Cb4", "F#3")
+KEY_PATTERN = re.compile(r"^([A-G])(b|#)?(-?\d)$")
+# Largest denominator of the resampling ratio (bigger is more accurate in pitch but slower)
+MAX_DENOMINATOR = 160
+# Number of derived notes kept in memory
+CACHE_SIZE = 24
+# Extension of the members of a compressed sample pack
+PACK_MEMBER = ".npy"
+
+
+# Convert a note name into a number of semitones (MIDI note number, "C4" = 60)
+def key_number(key):
+    match = KEY_PATTERN.match(key)
+    if not match:
+        raise KeyError("Not a note: {0}".format(key))
+    letter, accidental, octave = match.groups()
+    number = 12 * (int(octave) + 1) + NATURALS[letter]
+    if accidental == "b":
+        number -= 1
+    elif accidental == "#":
+        number += 1
+    return number
+
+
+# Convert a number of semitones into the name used by the sample files (e.g.: 59 = "B3")
+def key_name(number):
+    return "{0}{1}".format(NOTE_NAMES[number % 12], number // 12 - 1)
+
+
+# Load the 16 bit samples of a wav file
+def read_sample(path):
+    _, data = wavfile.read(path)
+    return data
+
+
+# Lossless transform that makes the samples compress about twice as well: second order differences of each channel,
+# split into a plane of low bytes and a plane of high bytes (the differences wrap around like the 16 bit samples do, so
+# adding them back up gives the exact samples), shape (2 bytes, channels, number of samples)
+def encode(samples):
+    samples = samples.reshape(len(samples), -1)
+    differences = np.diff(samples, n=2, axis=0, prepend=np.zeros((2, samples.shape[1]), np.int16))
+    planar = np.ascontiguousarray(differences.T)
+    return np.ascontiguousarray(planar.view(np.uint8).reshape(planar.shape[0], -1, 2).transpose(2, 0, 1))
+
+
+# Samples of shape (number of samples, channels) from the planes made by encode
+def decode(planes):
+    differences = np.ascontiguousarray(planes.transpose(1, 2, 0)).view(np.int16)[:, :, 0].T
+    return np.ascontiguousarray(np.cumsum(np.cumsum(differences, axis=0, dtype=np.int16), axis=0, dtype=np.int16))
+
+
+# Open a compressed sample pack for reading ("r") or writing ("w")
+def open_pack(path, mode="r"):
+    return zipfile.ZipFile(path, mode, compression=zipfile.ZIP_LZMA)
+
+
+# Add the 16 bit samples of a note to a pack opened for writing
+def pack_sample(archive, name, samples):
+    buffer = io.BytesIO()
+    np.save(buffer, encode(samples))
+    archive.writestr(name + PACK_MEMBER, buffer.getvalue())
+
+
+# Put every sample of a folder in a pack (e.g.: data -> data.zip)
+def pack_folder(folder, path):
+    with open_pack(path, "w") as archive:
+        for file_name in sorted(os.listdir(folder)):
+            name, extension = os.path.splitext(file_name)
+            if extension == ".wav":
+                pack_sample(archive, name, read_sample(os.path.join(folder, file_name)))
+
+
+# Samples of the notes of a pack (a zip file, the notes are decompressed when they are read)
+class SamplePack:
+    def __init__(self, path):
+        self.archive = open_pack(path)
+
+    def names(self):
+        return [name[:-len(PACK_MEMBER)] for name in self.archive.namelist() if name.endswith(PACK_MEMBER)]
+
+    def read(self, name):
+        return decode(np.load(io.BytesIO(self.archive.read(name + PACK_MEMBER))))
+
+
+# Change the pitch of 16 bit samples by a number of semitones by resampling them (higher notes become shorter)
+def pitch_shift(samples, semitones, max_denominator=MAX_DENOMINATOR):
+    if not semitones:
+        return samples
+    ratio = Fraction(2 ** (-semitones / 12)).limit_denominator(max_denominator)
+    shifted = resample_poly(samples.astype(np.float32), ratio.numerator, ratio.denominator, axis=0)
+    return np.clip(shifted, -32768, 32767).astype(np.int16)
+
+
+# Keeps only some of the samples in memory and derives the other notes from the closest one
+# step=1 keeps every note, step=3 keeps every third semitone (about a third of the memory)
+# Notes without a sample (e.g.: "Db8" or notes written as "Cb4") are derived the same way
+# The derived notes are kept in a cache of limited size (least recently used notes are dropped first)
+# folder is either a folder of wav files or a compressed pack made by trimmer.py
+class SampleBank:
+    def __init__(self, folder="data", step=1, cache_size=CACHE_SIZE, loader=read_sample, convert=None, revert=None):
+        self.folder = folder
+        self.step = step
+        self.cache_size = cache_size
+        # Size of the cache outside of a piece (decode_ahead makes room for the notes of a piece until end_piece)
+        self.base_cache_size = cache_size
+        self.loader = loader
+        # Turns the 16 bit samples into what the mixer plays (e.g.: a pygame sound or float samples)
+        self.convert = convert
+        # Gives back the samples of a converted note at the 16 bit scale (ideally a view, not a copy), so that the resident
+        # notes are only kept in their converted form and the other notes are still derived from them
+        self.revert = revert
+        if convert is not None and revert is None:
+            raise ValueError("Converted notes need a revert function to derive the other notes from them")
+        # Notes that have a sample file
+        self.available = {}
+        if os.path.isfile(folder):
+            self.pack = SamplePack(folder)
+            self.loader = self.pack.read
+            for name in self.pack.names():
+                if KEY_PATTERN.match(name):
+                    self.available[key_number(name)] = name
+        else:
+            self.pack = None
+            for file_name in os.listdir(folder):
+                name, extension = os.path.splitext(file_name)
+                if extension == ".wav" and KEY_PATTERN.match(name):
+                    self.available[key_number(name)] = os.path.join(folder, file_name)
+        if not self.available:
+            raise FileNotFoundError("No samples in " + folder)
+        # Every step-th note starting from the lowest one is kept in memory, as well as the highest one
+        lowest = min(self.available)
+        self.resident_numbers = sorted(number for number in self.available
+                                       if (number - lowest) % step == 0 or number == max(self.available))
+        # Resident notes, converted (the 16 bit samples are dropped once they are converted)
+        self.resident = {}
+        # Notes that were derived, least recently used first
+        self.cache = OrderedDict()
+        # The cache is shared with the threads that decode notes ahead of time
+        self.lock = threading.Lock()
+        # One lock per note being loaded or derived, so that two threads never decode the same note at once
+        self.note_locks = {}
+
+    def load(self, keys=None):
+        # Load the resident samples (all of them, or only the ones needed for these notes)
+        if keys is None:
+            numbers = self.resident_numbers
+        else:
+            numbers = dict.fromkeys(self.source(key_number(key) if isinstance(key, str) else key) for key in keys)
+        for number in numbers:
+            self.resident_sound(number)
+
+    def note_lock(self, kind, number):
+        with self.lock:
+            return self.note_locks.setdefault((kind, number), threading.Lock())
+
+    def resident_sound(self, number):
+        # Converted resident note, loaded the first time it is needed
+        sound = self.resident.get(number)
+        if sound is None:
+            # A note that another thread is already loading is waited for instead of being loaded twice
+            with self.note_lock("load", number):
+                sound = self.resident.get(number)
+                if sound is None:
+                    sound = self.loader(self.available[number])
+                    if self.convert is not None:
+                        sound = self.convert(sound)
+                    self.resident[number] = sound
+        return sound
+
+    def source(self, number):
+        # Closest resident note (the smallest pitch change sounds the most natural)
+        return min(self.resident_numbers, key=lambda resident: (abs(resident - number), resident < number))
+
+    def samples(self, key):
+        # Samples of a note at the 16 bit scale, derived from the closest resident note if needed
+        number = key_number(key) if isinstance(key, str) else key
+        source = self.source(number)
+        samples = self.resident_sound(source)
+        if self.convert is not None:
+            samples = self.revert(samples)
+        return pitch_shift(samples, number - source)
+
+    def cached(self, number):
+        with self.lock:
+            sound = self.cache.get(number)
+            if sound is not None:
+                self.cache.move_to_end(number)
+            return sound
+
+    def get(self, key):
+        number = key_number(key) if isinstance(key, str) else key
+        # Resident notes are already converted, they don't take up a spot in the cache
+        if self.is_resident(number):
+            return self.resident_sound(number)
+        sound = self.cached(number)
+        if sound is not None:
+            return sound
+        # Derive and convert without holding the cache lock, so that a note that is already cached is never held up
+        # A note that another thread is already deriving is waited for instead of being derived twice
+        with self.note_lock("get", number):
+            sound = self.cached(number)
+            if sound is not None:
+                return sound
+            sound = self.samples(number)
+            if self.convert is not None:
+                sound = self.convert(sound)
+            with self.lock:
+                self.cache[number] = sound
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return sound
+
+    def prefetch(self, keys):
+        # Prepare notes ahead of time (e.g.: the first notes of a piece), no more derived notes than the cache can hold
+        derived = 0
+        for key in dict.fromkeys(keys):
+            if not self.is_resident(key):
+                derived += 1
+                if derived > self.cache_size:
+                    break
+            self.get(key)
+
+    def decode_ahead(self, keys):
+        # Load, derive and convert every note on a background thread, in the given order (e.g.: the order the notes of a
+        # score play in), a note that plays before the thread gets to it is prepared when it plays
+        # Until end_piece, the cache grows to hold all the derived notes so that none is dropped before it plays
+        keys = list(dict.fromkeys(keys))
+        derived = sum(1 for key in keys if not self.is_resident(key))
+        with self.lock:
+            self.cache_size = max(self.base_cache_size, derived)
+        thread = threading.Thread(target=self.prefetch, args=(keys,), daemon=True)
+        thread.start()
+        return thread
+
+    def end_piece(self):
+        # Shrink the cache back to its size outside of a piece (the least recently used notes are dropped)
+        with self.lock:
+            self.cache_size = self.base_cache_size
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def is_resident(self, key):
+        number = key_number(key) if isinstance(key, str) else key
+        return self.source(number) == number
+
+    def ready(self, key):
+        # The note is loaded and converted, get returns it right away
+        number = key_number(key) if isinstance(key, str) else key
+        return number in (self.resident if self.is_resident(number) else self.cache)
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def sound_bytes(self, sound):
+        # Converted notes that aren't arrays (e.g.: pygame sounds) are measured through their samples
+        return (sound if self.convert is None or isinstance(sound, np.ndarray) else self.revert(sound)).nbytes
+
+    def resident_bytes(self):
+        return sum(self.sound_bytes(sound) for sound in list(self.resident.values()))
+
+    def cache_bytes(self):
+        with self.lock:
+            return sum(self.sound_bytes(sound) for sound in self.cache.values())
+
+    def memory_bytes(self):
+        # Everything the bank holds: the resident notes and the derived notes
+        return self.resident_bytes() + self.cache_bytes()
@@ -0,0 +1,126 @@
+import heapq
+import json
+
+from timing_log import FADE, NOTE_ON, SILENCE
+
+# Default values of a score (same as PianoPlayer.py)
+TEMPO = 120
+ARTICULATION = "legato"
+TIME_SIGNATURE = (3, 8)
+# Number of channels used by each track (also used by PianoPlayer.py)
+CHANNELS_PER_TRACK = 4
+# The pedal spreads the notes over all the channels of the track (so they ring longer), otherwise they alternate
+# between half of them
+ALTERNATING_CHANNELS = CHANNELS_PER_TRACK // 2
+
+
+# One thing for the mixer to do at a given time
+# channel is (track number, channel of the track) or (track number, "chord", index of the note in the chord)
+class Event:
+    __slots__ = ("time", "kind", "track", "channel", "key", "bar")
+
+    def __init__(self, time, kind, track, channel, key=None, bar=0):
+        self.time = time
+        self.kind = kind
+        self.track = track
+        self.channel = channel
+        self.key = key
+        self.bar = bar
+
+    def __lt__(self, other):
+        return (self.time, self.kind) < (other.time, other.kind)
+
+    def __repr__(self):
+        return "Event({0}, {1}, {2}, {3}, {4})".format(self.time, self.kind, self.track, self.channel, self.key)
+
+
+# A piece read from JSON, e.g.:
+# {"tempo": 120, "time_signature": [3, 8],
+#  "tracks": [{"bars": [[["E5", 16], ["Eb5", 16]], [[["A2", "E3"], 8], ["s", 8]]], "pedal_bars": [1]}]}
+# Each note is [key, value] or [key, value, articulation], "s" is a silence and a list of keys is a chord
+class Score:
+    def __init__(self, tracks, tempo=TEMPO, time_signature=TIME_SIGNATURE, articulation=ARTICULATION, name=""):
+        self.tracks = tracks
+        self.tempo = tempo
+        self.time_signature = tuple(time_signature)
+        self.articulation = articulation
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get("tracks"):
+            raise ValueError("A score needs at least one track")
+        # Only the first letter of an articulation is read ("l" for legato, anything else is staccato)
+        articulation = data.get("articulation", ARTICULATION)
+        if not isinstance(articulation, str) or not articulation:
+            raise ValueError("Invalid articulation: {0!r}".format(articulation))
+        for track in data["tracks"]:
+            for bar in track.get("bars", []):
+                for note in bar:
+                    if len(note) < 2 or not note[1] or note[1] <= 0:
+                        raise ValueError("Invalid note: {0}".format(note))
+                    if len(note) > 2 and (not isinstance(note[2], str) or not note[2]):
+                        raise ValueError("Invalid articulation: {0}".format(note))
+        return cls(data["tracks"], data.get("tempo", TEMPO), data.get("time_signature", TIME_SIGNATURE),
+                   articulation, data.get("name", ""))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+    def keys(self, events=None):
+        # Every key that needs a sample, in the order they first play (from the events of the score if they were already
+        # built)
+        keys = []
+        for event in self.events() if events is None else events:
+            if event.kind == NOTE_ON:
+                keys.append(event.key)
+        return list(dict.fromkeys(keys))
+
+    def duration(self):
+        # Milliseconds of the shortest note value in the piece (the value with the biggest number)
+        min_val = max(note[1] for track in self.tracks for bar in track.get("bars", []) for note in bar)
+        beat_duration = 60 / self.tempo * 1000
+        return round(self.time_signature[1] / min_val * beat_duration), min_val
+
+    def track_events(self, number, duration, min_val):
+        # Sorted events of a single track (same timing rules as N.play in PianoPlayer.py)
+        track = self.tracks[number]
+        pedal_bars = set(track.get("pedal_bars", []))
+        events = []
+        beat = 0
+        for bar_number, bar in enumerate(track.get("bars", [])):
+            pedal = bar_number in pedal_bars
+            for note in bar:
+                key, value = note[0], note[1]
+                articulation = note[2] if len(note) > 2 else self.articulation
+                start = beat * duration
+                length = min_val / value
+                # Staccato notes fade one unit before the next note, legato notes when the next note starts
+                end = (beat + length - (0 if articulation[0] == "l" else 1)) * duration
+                if key == "s":
+                    # Quickly fade all the notes of the track
+                    if not pedal:
+                        events.append(Event(start, SILENCE, number, None, bar=bar_number))
+                elif isinstance(key, list):
+                    # Each note of a chord has its own channel
+                    for index, chord_key in enumerate(key):
+                        channel = (number, "chord", index)
+                        events.append(Event(start, NOTE_ON, number, channel, chord_key, bar_number))
+                        if not pedal:
+                            events.append(Event(end, FADE, number, channel, bar=bar_number))
+                else:
+                    # The notes alternate between half the channels of the track (all of them when the pedal is pressed)
+                    channel = (number, beat % (CHANNELS_PER_TRACK if pedal else ALTERNATING_CHANNELS))
+                    events.append(Event(start, NOTE_ON, number, channel, key, bar_number))
+                    if not pedal:
+                        events.append(Event(end, FADE, number, channel, bar=bar_number))
+                beat += round(length)
+        events.sort()
+        return events
+
+    def events(self):
+        # Every event of every track in order, merging the sorted tracks (k-way merge)
+        duration, min_val = self.duration()
+        return heapq.merge(*(self.track_events(number, duration, min_val) for number in range(len(self.tracks))))
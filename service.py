@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# The client prints JSON, keep the pygame banner out of it
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from mixer import NullSink, PygameSink, SoftwareMixer, WaveFileSink, from_float, to_float
+from samples import SampleBank
+from score import CHANNELS_PER_TRACK, FADE, NOTE_ON, SILENCE, Score
+
+# Unix socket the service listens on (where Unix sockets are not available, a TCP port on localhost is used instead)
+SOCKET = "pianoplayer.sock"
+HOST = "127.0.0.1"
+PORT = 8765
+# Milliseconds for a note to fade out (same as PianoPlayer.py)
+NOTE_FADE = 200
+# Milliseconds before the first note of a piece
+DELAY = 1000
+# Largest request a client can send (a score is a single line of JSON)
+REQUEST_LIMIT = 2 ** 24
+
+# States of the player
+PLAYING = "playing"
+PAUSED = "paused"
+STOPPED = "stopped"
+
+
+# A score waiting in the queue or being played
+class Piece:
+    def __init__(self, number, score, events, sounds):
+        self.number = number
+        self.name = score.name or "score {0}".format(number)
+        self.events = events
+        # Sound of every key of the score (prepared before the piece is queued)
+        self.sounds = sounds
+        self.duration = events[-1].time + DELAY if events else 0
+        # Milliseconds played so far
+        self.position = 0
+        self.skipped = False
+
+    def info(self):
+        return {"id": self.number, "name": self.name, "position_ms": round(self.position),
+                "duration_ms": round(self.duration)}
+
+
+# Long running player that keeps the samples in memory and plays the scores sent by any number of clients
+# The notes are started from the event loop and mixed in the mixer thread, so the clients never hold up the audio
+class PlaybackService:
+    def __init__(self, mixer, bank):
+        self.mixer = mixer
+        self.bank = bank
+        self.queue = deque()
+        self.current = None
+        self.state = PLAYING
+        self.numbers = itertools.count(1)
+        # Derivation and conversion of the samples happen on a single thread, away from the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # Wakes up the player when a command changes what it should be doing
+        self.changed = asyncio.Event()
+
+    def prepare(self, data):
+        # Runs on the executor thread, so that reading a big score never delays the notes of the piece being played:
+        # read the score, build its events and look up (and derive if needed) every key
+        score = Score.from_dict(data)
+        events = list(score.events())
+        sounds = {key: self.bank.get(key) for key in score.keys(events)}
+        return score, events, sounds
+
+    async def submit(self, data):
+        score, events, sounds = await asyncio.get_running_loop().run_in_executor(self.executor, self.prepare, data)
+        piece = Piece(next(self.numbers), score, events, sounds)
+        self.queue.append(piece)
+        self.notify()
+        return piece
+
+    def notify(self):
+        self.changed.set()
+
+    async def wait(self, timeout=None):
+        # Sleep until the timeout or until a command changes the state
+        self.changed.clear()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def silence(self, milliseconds=NOTE_FADE):
+        self.mixer.fadeout_all(milliseconds)
+
+    def perform(self, event, piece):
+        if event.kind == NOTE_ON:
+            self.mixer.play(event.channel, piece.sounds[event.key])
+        elif event.kind == FADE:
+            self.mixer.fadeout(event.channel, NOTE_FADE)
+        elif event.kind == SILENCE:
+            # Quickly fade all the notes of the track
+            for n in range(CHANNELS_PER_TRACK):
+                self.mixer.fadeout((event.track, n), NOTE_FADE)
+
+    async def play(self, piece):
+        loop = asyncio.get_running_loop()
+        start = loop.time() + DELAY / 1000
+        index = 0
+        while index < len(piece.events):
+            if piece.skipped or self.state == STOPPED:
+                self.silence()
+                return
+            if self.state == PAUSED:
+                self.silence()
+                paused = loop.time()
+                await self.wait()
+                # The rest of the piece starts later by the time spent paused
+                start += loop.time() - paused
+                continue
+            event = piece.events[index]
+            delay = start + event.time / 1000 - loop.time()
+            piece.position = max(0, (loop.time() - start) * 1000)
+            if delay > 0:
+                # Sleep until the next event, unless a command comes in first
+                await self.wait(delay)
+                continue
+            # Events that are due (or late) are all performed before sleeping again
+            self.perform(event, piece)
+            index += 1
+        piece.position = piece.duration
+
+    async def run(self):
+        while True:
+            if self.state != PLAYING or not self.queue:
+                await self.wait()
+                continue
+            self.current = self.queue.popleft()
+            try:
+                await self.play(self.current)
+            finally:
+                self.current = None
+
+    def status(self):
+        return {"state": self.state, "current": self.current.info() if self.current else None,
+                "queue": [piece.info() for piece in self.queue], "mixer": self.mixer.stats()}
+
+    async def command(self, request):
+        name = request.get("command")
+        if name == "queue":
+            piece = await self.submit(request.get("score") or {})
+            return {"id": piece.number, "position": len(self.queue)}
+        if name == "play":
+            self.state = PLAYING
+        elif name == "pause":
+            if self.state == PLAYING:
+                self.state = PAUSED
+        elif name == "stop":
+            # Stop the current piece, the queue waits for the next play command
+            self.state = STOPPED
+        elif name == "skip":
+            if self.current:
+                self.current.skipped = True
+        elif name == "clear":
+            self.queue.clear()
+        elif name != "status":
+            raise ValueError("Unknown command: {0}".format(name))
+        self.notify()
+        return self.status()
+
+    async def handle(self, reader, writer):
+        # Each client sends one JSON request per line and gets one JSON response per line
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.command(json.loads(line))
+                    response["ok"] = True
+                except Exception as error:
+                    # Whatever goes wrong with one request, the client gets an answer and the connection stays open
+                    response = {"ok": False, "error": "{0}: {1}".format(type(error).__name__, error)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path=SOCKET, port=None):
+        if port is None and hasattr(asyncio, "start_unix_server"):
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.handle, path, limit=REQUEST_LIMIT)
+            print("Listening on " + path)
+        else:
+            server = await asyncio.start_server(self.handle, HOST, port or PORT, limit=REQUEST_LIMIT)
+            print("Listening on {0}:{1}".format(HOST, port or PORT))
+        player = asyncio.ensure_future(self.run())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            player.cancel()
+            self.silence()
+            self.executor.shutdown()
+            if port is None and os.path.exists(path):
+                os.remove(path)
+
+
+# Send a request to a running service and return its response
+async def request(data, path=SOCKET, port=None):
+    if port is None and hasattr(asyncio, "open_unix_connection"):
+        reader, writer = await asyncio.open_unix_connection(path, limit=REQUEST_LIMIT)
+    else:
+        reader, writer = await asyncio.open_connection(HOST, port or PORT, limit=REQUEST_LIMIT)
+    writer.write(json.dumps(data).encode() + b"\n")
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response
+
+
+def create_sink(name):
+    if name == "pygame":
+        # The output stream has the same format as the samples
+        pygame.mixer.init(frequency=44100, size=-16, channels=2)
+        return PygameSink()
+    if name == "null":
+        return NullSink()
+    return WaveFileSink(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play queued scores in the background, controlled through a local socket")
+    parser.add_argument("command", nargs="?", default="serve",
+                        help="serve, or a command sent to the service: queue, play, pause, stop, skip, clear, status")
+    parser.add_argument("score", nargs="?", help="JSON score file (for queue)")
+    parser.add_argument("--socket", default=SOCKET, help="Unix socket path")
+    parser.add_argument("--port", type=int, help="listen on this TCP port on localhost instead of a Unix socket")
+    parser.add_argument("--sink", default="pygame", help="pygame, null, or a wav file to write the audio to")
+    parser.add_argument("--samples", default="data", help="folder of wav files or compressed pack made by trimmer.py")
+    parser.add_argument("--step", type=int, default=1, help="only keep every Nth semitone in memory")
+    parser.add_argument("--block-size", type=int, default=512, help="number of samples mixed at once")
+    arguments = parser.parse_args()
+
+    if arguments.command != "serve":
+        data = {"command": arguments.command}
+        if arguments.command == "queue":
+            with open(arguments.score) as file:
+                data["score"] = json.load(file)
+        response = asyncio.run(request(data, arguments.socket, arguments.port))
+        print(json.dumps(response, indent=2))
+        return 0 if response.get("ok") else 1
+
+    # Keep every resident sample in memory for as long as the service runs
+    bank = SampleBank(arguments.samples, step=arguments.step, convert=to_float, revert=from_float)
+    bank.load()
+    mixer = SoftwareMixer(create_sink(arguments.sink), block_size=arguments.block_size)
+    mixer.start()
+    try:
+        asyncio.run(PlaybackService(mixer, bank).serve(arguments.socket, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mixer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
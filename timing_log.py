@@ -0,0 +1,154 @@
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+# Number of events kept (the oldest events are overwritten once the log is full)
+CAPACITY = 65536
+# An event that happens later than this many milliseconds after its scheduled time is late (one frame at 60 fps)
+LATE = 1000 / 60
+# Width in milliseconds of the bins of the jitter histogram
+BIN_WIDTH = 2
+# Number of characters of the longest bar of the histogram
+HISTOGRAM_WIDTH = 50
+
+# Kinds of events (same values as score.py, fades come first when events are at the same time)
+FADE = 0
+SILENCE = 1
+NOTE_ON = 2
+KIND_NAMES = ("fade", "silence", "note_on")
+
+# One row per event, times in milliseconds since the start of the piece
+# channel is -1 when every channel of the track is faded (silences), pitch is -1 when there is no note
+DTYPE = np.dtype([("scheduled", np.float64), ("actual", np.float64), ("kind", np.uint8), ("track", np.int16),
+                  ("channel", np.int16), ("pitch", np.int16), ("bar", np.int32)])
+
+
+# Records when every note-on, fade and silence was supposed to happen and when it actually happened
+# The rows are allocated once and recording an event only fills one of them, so the log doesn't slow down the
+# timing it measures (nothing is written to disk until dump is called)
+class TimingLog:
+    def __init__(self, enabled=True, capacity=CAPACITY):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.events = np.zeros(capacity if enabled else 0, DTYPE)
+        # Number of events recorded since the start (the next row is count % capacity)
+        self.count = 0
+        # Clock reading when the piece started, the actual times are measured from it
+        self.start_time = time.perf_counter()
+
+    def start(self):
+        # Call at the same moment as the origin of the scheduled times
+        self.start_time = time.perf_counter()
+
+    def elapsed(self):
+        # Milliseconds since the start (sub-millisecond resolution, unlike pygame.time.get_ticks)
+        return (time.perf_counter() - self.start_time) * 1000
+
+    def record(self, kind, scheduled, actual, channel=-1, pitch=-1, bar=-1, track=-1):
+        if not self.enabled:
+            return
+        self.events[self.count % self.capacity] = (scheduled, actual, kind, track, channel, pitch, bar)
+        self.count += 1
+
+    def ordered(self):
+        # Events from the oldest to the newest
+        if self.count <= self.capacity:
+            return self.events[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate([self.events[start:], self.events[:start]])
+
+    def dump(self, path):
+        save(self.ordered(), path)
+
+
+# Save events as CSV (readable) or in the binary numpy format (any other extension, e.g.: .npy)
+def save(events, path):
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(DTYPE.names)
+            for row in events.tolist():
+                writer.writerow([round(row[0], 3), round(row[1], 3), KIND_NAMES[row[2]]] + list(row[3:]))
+    else:
+        with open(path, "wb") as file:
+            np.save(file, events)
+
+
+def load(path):
+    if not path.lower().endswith(".csv"):
+        return np.load(path)
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    events = np.zeros(len(rows), DTYPE)
+    for i, row in enumerate(rows):
+        events[i] = (float(row["scheduled"]), float(row["actual"]), KIND_NAMES.index(row["kind"]), int(row["track"]),
+                     int(row["channel"]), int(row["pitch"]), int(row["bar"]))
+    return events
+
+
+# Number of events in each bin of lateness, returns (start of the bin in milliseconds, count) pairs
+def histogram(lateness, bin_width=BIN_WIDTH):
+    if not len(lateness):
+        return []
+    first = np.floor(lateness.min() / bin_width) * bin_width
+    last = np.floor(lateness.max() / bin_width) * bin_width + bin_width
+    counts, edges = np.histogram(lateness, np.arange(first, last + bin_width / 2, bin_width))
+    return list(zip(edges[:-1].tolist(), counts.tolist()))
+
+
+def analyze(events, late=LATE, bin_width=BIN_WIDTH):
+    lateness = events["actual"] - events["scheduled"]
+    result = {"events": len(events), "kinds": {}, "late_bars": []}
+    for kind, name in enumerate(KIND_NAMES):
+        values = lateness[events["kind"] == kind]
+        if not len(values):
+            continue
+        result["kinds"][name] = {"count": len(values), "late": int(np.count_nonzero(values > late)),
+                                 "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+                                 "p99": float(np.percentile(values, 99)), "max": float(values.max()),
+                                 "histogram": histogram(values, bin_width)}
+    # Late note onsets of each bar of each track
+    onsets = events[events["kind"] == NOTE_ON]
+    onset_lateness = onsets["actual"] - onsets["scheduled"]
+    for track, bar in sorted(set(zip(onsets["track"].tolist(), onsets["bar"].tolist()))):
+        mask = (onsets["track"] == track) & (onsets["bar"] == bar)
+        result["late_bars"].append({"track": track, "bar": bar, "notes": int(np.count_nonzero(mask)),
+                                    "late": int(np.count_nonzero(onset_lateness[mask] > late)),
+                                    "max": float(onset_lateness[mask].max())})
+    return result
+
+
+def report(result, late=LATE):
+    lines = ["{0} events".format(result["events"])]
+    for name, values in result["kinds"].items():
+        lines.append("")
+        lines.append("{0}: {1} events, {2} later than {3:.1f}ms, p50 {4:.1f}ms  p95 {5:.1f}ms  p99 {6:.1f}ms  "
+                     "max {7:.1f}ms".format(name, values["count"], values["late"], late, values["p50"], values["p95"],
+                                            values["p99"], values["max"]))
+        largest = max(count for _, count in values["histogram"])
+        for start, count in values["histogram"]:
+            lines.append("{0:>8.1f}ms {1:>6} {2}".format(start, count, "#" * round(count / largest * HISTOGRAM_WIDTH)))
+    lines.append("")
+    lines.append("{0:>6} {1:>5} {2:>6} {3:>5} {4:>9}".format("track", "bar", "notes", "late", "max late"))
+    for values in result["late_bars"]:
+        lines.append("{0:>6} {1:>5} {2:>6} {3:>5} {4:>7.1f}ms".format(values["track"], values["bar"], values["notes"],
+                                                                    values["late"], values["max"]))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jitter histograms and late notes per bar of a timing log")
+    parser.add_argument("path", help="timing log saved by TimingLog.dump (.csv or .npy)")
+    parser.add_argument("--late", type=float, default=LATE, help="milliseconds after which an event is late")
+    parser.add_argument("--bin-width", type=float, default=BIN_WIDTH, help="milliseconds per histogram bin")
+    arguments = parser.parse_args()
+    result = analyze(load(arguments.path), arguments.late, arguments.bin_width)
+    print("\n".join(report(result, arguments.late)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,23 @@
+import os
+
 from scipy.io import wavfile
 
+from samples import open_pack, pack_sample
+
 THRESHOLD = 500
 keys = ["A", "B", "C", "D", "E", "F", "G", "Ab", "Bb", "Cb", "Db", "Eb", "Fb", "Gb"]
 total_trimmed = 0
+# Folder of the original samples and folder of the trimmed samples
+SOURCE = "wav"
+DESTINATION = "data"
+# Also put the trimmed samples in a compressed pack that SampleBank can play from (e.g.: "data.zip", None for no pack)
+PACK = None
 
 
-def trim_note(key_name):
+def trim_note(key_name, source=SOURCE, destination=DESTINATION, pack=None):
     start_crop = 0
     end_crop = 0
-    fs, data = wavfile.read('wav\\Piano.ff.{0}.wav'.format(key_name))
+    fs, data = wavfile.read(os.path.join(source, 'Piano.ff.{0}.wav'.format(key_name)))
     for ind, line in enumerate(data):
         if abs(line[0]) >= THRESHOLD or abs(line[1]) >= THRESHOLD:
             start_crop = ind
@@ -19,20 +28,27 @@ def trim_note(key_name):
         if abs(data[ind][0]) >= THRESHOLD or abs(data[ind][1]) >= THRESHOLD:
             end_crop = ind
             break
-    wavfile.write("data\\{0}.wav".format(key_name), fs, data[start_crop:end_crop])
+    wavfile.write(os.path.join(destination, "{0}.wav".format(key_name)), fs, data[start_crop:end_crop])
+    # Losslessly compressed copy (about a third of the size of the wav file)
+    if pack is not None:
+        pack_sample(pack, key_name, data[start_crop:end_crop])
 
 
 def main():
     global total_trimmed
+    pack = open_pack(PACK, "w") if PACK else None
     for key in keys:
         for num in range(0, 9):
             note_name = "{0}{1}".format(key, num)
             try:
-                trim_note(note_name)
+                trim_note(note_name, pack=pack)
                 print("Trimmed: " + note_name)
                 total_trimmed += 1
-            except WindowsError:
+            except OSError:
                 print("Note not found: " + note_name)
+    if pack is not None:
+        pack.close()
+        print("Packed: " + PACK)
 
 
 if __name__ == "__main__":